@@ -1,288 +1,601 @@
 import asyncio
+import json
+import mimetypes
 import os
-from collections import deque
-from datetime import datetime
+import secrets
+import subprocess
+import sys
+import time
+from email.utils import formatdate
+from urllib.parse import quote
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from assets import IMMUTABLE, REVALIDATE, AssetBundle
+from backend import MAX_PAGE_LIMIT, PAGE_LIMIT, WORKER_STALE, CommandError, EngineClient
+import jobs
+from jobs import (DOWNLOAD_DIR, ENGINE_LOCK, ENGINE_SOCKET, LOG_RING_SIZE, PROGRESS_TICK, SLOW_CALLBACK_THRESHOLD,
+                  STATUS_TABLE)
+from loopmon import LoopMonitor
+import metrics
+from payload import PayloadCache, dumps, json_payload
 
 app = FastAPI()
 
-DOWNLOAD_DIR = './downloads'
-os.makedirs(DOWNLOAD_DIR, exist_ok=True)
-MAX_ACTIVE_DOWNLOADS = 2
+SSE_KEEPALIVE = 15
+FILE_CHUNK_SIZE = 1024 * 1024
+MAX_RANGES = 32
+ZEROCOPY_SEND = "http.response.zerocopysend"
+STREAM_READAHEAD = 8  # pieces
+STREAM_DEADLINE_MS = 500
+STREAM_TIMEOUT = 30
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+ASSET_DIR = './assets'
+# /add/batch goes to the engine in parts of about this many bytes, well
+# under its command line limit.
+BATCH_COMMAND_BYTES = 1024 * 1024
 
-download_queue = deque()
-active_downloads = {}
-completed_files = {}
-downloading_tasks = {}
-debug_logs = {}
+# Run as many uvicorn/gunicorn workers as needed; they all talk to a single
+# engine process, started by whichever worker first finds none running.
+backend = None
+engine_process = None
+assets = AssetBundle(STATIC_DIR, ASSET_DIR)
+# Serialized /progress bodies by (version, since); most requests share one.
+progress_payloads = PayloadCache(64)
+progress_subscribers = set()
+# Per worker; each reports it to the state store (worker_reporter) so
+# /metrics can show every worker's, with a pid label.
+stats = {"file_bytes_served": 0}
+# This worker's own event loop; the engine process has its own.
+loop_monitor = LoopMonitor(threshold=SLOW_CALLBACK_THRESHOLD)
 
-def add_log(magnet, message):
-    ts = datetime.now().strftime("%H:%M:%S")
-    debug_logs.setdefault(magnet, []).append(f"[{ts}] {message}")
-    if len(debug_logs[magnet]) > 10:
-        debug_logs[magnet] = debug_logs[magnet][-10:]
+def sse_message(data):
+    return b"data: " + dumps(data) + b"\n\n"
 
-async def download_worker():
+async def json_response(request, payload, headers=None):
+    body, encoding_headers = await payload.render(request.headers.get("accept-encoding"))
+    return Response(body, headers={**encoding_headers, **(headers or {})}, media_type="application/json")
+
+async def stream_snapshot():
+    # Active rows and fleet totals; the completed catalog is paged from
+    # /progress?status=completed instead of riding along on every tick.
+    page = await backend.view("progress_page", status="active", limit=MAX_PAGE_LIMIT)
+    return {"version": page["version"], "active": page["active"], "summary": await backend.view("summary")}
+
+async def progress_broadcaster():
+    # Serialize once per tick and fan the same bytes out to every subscriber.
+    last = None
+    while True:
+        await asyncio.sleep(PROGRESS_TICK)
+        if not progress_subscribers:
+            last = None
+            continue
+        version = (await backend.view("progress_cursor"))["version"]
+        if version == last:
+            continue
+        last = version
+        payload = sse_message(await stream_snapshot())
+        for queue in list(progress_subscribers):
+            # Slow clients only ever get the newest snapshot.
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(payload)
+
+def report_worker(report):
+    jobs.store.publish(*jobs.store.encode_published([], {f"worker:{os.getpid()}": report}))
+    # Reports of workers that have gone away.
+    jobs.store.prune_published("worker:", report["at"] - 10 * WORKER_STALE)
+
+async def worker_reporter():
     while True:
-        if len(active_downloads) < MAX_ACTIVE_DOWNLOADS and download_queue:
-            magnet = download_queue.popleft()
-            debug_logs[magnet] = []
-            task = asyncio.create_task(handle_download(magnet))
-            downloading_tasks[magnet] = task
-        await asyncio.sleep(2)
-
-async def handle_download(magnet):
+        await asyncio.sleep(PROGRESS_TICK)
+        report = {"at": time.time(), "file_bytes_served": stats["file_bytes_served"], "loop": loop_monitor.view()}
+        await asyncio.to_thread(report_worker, report)
+
+def parse_range(header, size):
+    # Returns None to ignore the header (serve 200), [] when nothing is
+    # satisfiable (416), else sorted, coalesced inclusive (start, end) pairs.
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition("-")
+        if not sep:
+            return None
+        try:
+            if not first.strip():
+                length = int(last)
+                if length > 0 and size > 0:
+                    ranges.append((max(0, size - length), size - 1))
+                continue
+            start = int(first)
+            end = int(last) if last.strip() else size - 1
+        except ValueError:
+            return None
+        if start < 0 or start > end:
+            return None
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+class RangeFileResponse(Response):
+    # Serves a file with single/multi Range support. Bytes go out through the
+    # ASGI zero-copy extension (os.sendfile in the server) when available,
+    # otherwise through pread in the threadpool.
+    def __init__(self, path, request, filename=None, media_type=None, stat_result=None, extra_headers=None):
+        st = stat_result or os.stat(path)
+        self.path = path
+        self.background = None
+        self.media_type = media_type or mimetypes.guess_type(filename or path)[0] or "application/octet-stream"
+        size = st.st_size
+        etag = f'"{st.st_mtime_ns:x}-{size:x}"'
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": formatdate(st.st_mtime, usegmt=True),
+            **(extra_headers or {}),
+        }
+        if filename:
+            headers["content-disposition"] = f"attachment; filename*=utf-8''{quote(filename)}"
+        ranges = None
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header and (if_range is None or if_range in (etag, headers["last-modified"])):
+            ranges = parse_range(range_header, size)
+        self.parts = []
+        if request.headers.get("if-none-match") == etag:
+            self.status_code = 304
+            self.init_headers(headers)
+            return
+        if ranges is None:
+            self.status_code = 200
+            self.parts.append((b"", 0, size))
+            length = size
+        elif not ranges:
+            self.status_code = 416
+            headers["content-range"] = f"bytes */{size}"
+            length = 0
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            self.status_code = 206
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+            self.parts.append((b"", start, end - start + 1))
+            length = end - start + 1
+        else:
+            self.status_code = 206
+            boundary = secrets.token_hex(13)
+            part_type = self.media_type
+            self.media_type = f"multipart/byteranges; boundary={boundary}"
+            length = 0
+            for i, (start, end) in enumerate(ranges):
+                head = (b"" if i == 0 else b"\r\n") + (
+                    f"--{boundary}\r\n"
+                    f"Content-Type: {part_type}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n").encode()
+                self.parts.append((head, start, end - start + 1))
+                length += len(head) + end - start + 1
+            self.trailer = f"\r\n--{boundary}--\r\n".encode()
+            length += len(self.trailer)
+        headers["content-length"] = str(length)
+        self.init_headers(headers)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method") == "HEAD" or not self.parts:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        zerocopy = ZEROCOPY_SEND in scope.get("extensions", {})
+        trailer = getattr(self, "trailer", b"")
+        with open(self.path, "rb") as f:
+            for head, offset, count in self.parts:
+                if head:
+                    await send({"type": "http.response.body", "body": head, "more_body": True})
+                if zerocopy:
+                    await send({"type": ZEROCOPY_SEND, "file": f, "offset": offset,
+                                "count": count, "more_body": True})
+                    stats["file_bytes_served"] += count
+                    continue
+                fd = f.fileno()
+                while count > 0:
+                    chunk = await run_in_threadpool(os.pread, fd, min(FILE_CHUNK_SIZE, count), offset)
+                    if not chunk:
+                        break
+                    offset += len(chunk)
+                    count -= len(chunk)
+                    stats["file_bytes_served"] += len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": trailer, "more_body": False})
+
+
+async def wait_piece(infohash, first, last):
+    # Puts deadlines on first..last and waits for `first` to be on disk.
+    # Raises KeyError if the torrent went away, TimeoutError if it stalls.
+    result = await backend.command("stream_pieces", timeout=STREAM_TIMEOUT + 5, infohash=infohash, first=first,
+                                   last=last, deadline_ms=STREAM_DEADLINE_MS, wait=STREAM_TIMEOUT)
+    if result["state"] == "timeout":
+        raise asyncio.TimeoutError
+    if result["state"] != "ready":
+        raise KeyError(infohash)
+
+async def close_stream(infohash):
     try:
-        from torrentp import TorrentDownloader
-    except ImportError:
-        add_log(magnet, "ERROR: torrentp not installed.")
-        return
+        await backend.command("stream_close", infohash=infohash)
+    except Exception:
+        pass
+
+async def stream_pieces(infohash, span, start, end):
+    path, base, _, piece_length = span
+    last_piece = (base + end) // piece_length
+    pos = start
     try:
-        torrent = TorrentDownloader(magnet, DOWNLOAD_DIR)
-        active_downloads[magnet] = {
-            "status": "Connecting to peers...",
-            "progress": "0.00%",
-            "download_speed": "0 KB/s",
-            "peers": 0,
-            "eta": "Calculating...",
-            "file_size": "Unknown",
-            "logs": debug_logs.get(magnet, [])
-        }
-        add_log(magnet, "Queued for download")
-        await torrent.start_download()
-        add_log(magnet, "Torrent client started")
-        no_peer_start_time = None
-        while torrent.status.is_downloading:
-            peers = getattr(torrent.status, 'num_peers', 0) or 0
-            progress = getattr(torrent.status, 'progress', 0.0) or 0.0
-            speed_bps = getattr(torrent.status, 'download_rate', 0) or 0
-            total_size = getattr(torrent.status, 'total_size', 0) or 0
-
-            add_log(magnet, f"Peers={peers} | Progress={progress:.2f}% | Speed={speed_bps / 1024:.1f}KB/s")
-
-            if peers == 0:
-                if no_peer_start_time is None:
-                    no_peer_start_time = asyncio.get_running_loop().time()
-                    add_log(magnet, "No peers, timer started")
-                elif asyncio.get_running_loop().time() - no_peer_start_time > 120:
-                    add_log(magnet, "Auto-cancel: no peers for 2m")
-                    await torrent.stop_download()
-                    active_downloads.pop(magnet, None)
-                    downloading_tasks.pop(magnet, None)
-                    return
-            else:
-                no_peer_start_time = None
-
-            eta_str = "Calculating..."
-            if speed_bps > 100 and progress > 0 and progress < 100 and total_size > 0:
-                bytes_remaining = total_size * (100 - progress) / 100
-                eta_seconds = int(bytes_remaining / speed_bps)
-                m, s = divmod(eta_seconds, 60)
-                eta_str = f"{m:02d}:{s:02d}"
-
-            active_downloads[magnet] = {
-                "status": "Downloading" if peers > 0 else "Connecting to peers...",
-                "progress": f"{max(0, min(100, progress)):.2f}%",
-                "download_speed": f"{speed_bps / 1024:.1f} KB/s" if speed_bps > 0 else "0 KB/s",
-                "peers": max(0, peers),
-                "eta": eta_str,
-                "file_size": f"{total_size / (1024*1024):.2f} MB" if total_size > 0 else "Unknown",
-                "logs": debug_logs.get(magnet, [])
-            }
-            await asyncio.sleep(3)
-        # Complete
-        if hasattr(torrent.status, 'is_finished') and torrent.status.is_finished:
-            add_log(magnet, "Download complete")
-            active_downloads.pop(magnet, None)
-            completed_files[magnet] = []
-            if hasattr(torrent, 'files') and torrent.files:
-                for file in torrent.files:
-                    path = os.path.join(DOWNLOAD_DIR, file)
-                    if os.path.exists(path):
-                        completed_files[magnet].append({
-                            "file": file,
-                            "download_url": f"/file/{file}"
-                        })
-                        add_log(magnet, f"File ready: {file}")
-        await torrent.stop_download()
-    except Exception as e:
-        add_log(magnet, f"ERROR: {str(e)}")
-        active_downloads.pop(magnet, None)
+        with open(path, "rb") as f:
+            fd = f.fileno()
+            while pos <= end:
+                piece = (base + pos) // piece_length
+                await wait_piece(infohash, piece, min(last_piece, piece + STREAM_READAHEAD - 1))
+                piece_end = min(end + 1, (piece + 1) * piece_length - base)
+                while pos < piece_end:
+                    chunk = await run_in_threadpool(os.pread, fd, min(FILE_CHUNK_SIZE, piece_end - pos), pos)
+                    if not chunk:
+                        return
+                    pos += len(chunk)
+                    stats["file_bytes_served"] += len(chunk)
+                    yield chunk
+    except (asyncio.TimeoutError, KeyError, CommandError):
+        # Stalled or removed mid-stream; the short body tells the client.
+        return
     finally:
-        downloading_tasks.pop(magnet, None)
+        await close_stream(infohash)
+
+def spawn_engine():
+    # Only when the engine lock is free; if several workers race, the extra
+    # engine processes exit on the lock.
+    global engine_process
+    if engine_process is not None and engine_process.poll() is None:
+        return
+    lock = jobs.claim_engine(ENGINE_LOCK)
+    if lock is None:
+        return
+    os.close(lock)
+    engine_process = subprocess.Popen([sys.executable, jobs.__file__])
 
 @app.on_event("startup")
 async def startup_event():
-    asyncio.create_task(download_worker())
+    global backend
+    assets.build()
+    backend = EngineClient(ENGINE_SOCKET, STATUS_TABLE, jobs.store, spawn=spawn_engine)
+    asyncio.create_task(loop_monitor.run())
+    asyncio.create_task(progress_broadcaster())
+    asyncio.create_task(worker_reporter())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # The worker that started the engine stops it; the others start a new
+    # one on their next command.
+    if engine_process is not None:
+        engine_process.terminate()
+        await asyncio.to_thread(engine_process.wait)
 
 @app.get("/")
 def home():
     return {"message": "Torrent Dashboard API running (local only)"}
 
-@app.get("/dashboard", response_class=HTMLResponse)
-def dashboard():
-    return """
-    <!DOCTYPE html>
-    <html>
-    <head>
-      <title>Torrent Dashboard</title>
-      <meta name="viewport" content="width=device-width, initial-scale=1">
-      <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-      <style>
-        .progress { height: 24px; }
-        .torrent { margin-bottom: 24px; }
-        .log-box {
-          background: #23272a; color: #00ff00;
-          font-family: monospace; font-size: 12px;
-          padding: 7px; border-radius: 4px;
-          max-height: 70px; overflow-y:auto; white-space: pre-wrap;
-        }
-        .magnet-text {word-break:break-all; font-size:12px;}
-      </style>
-    </head>
-    <body class="bg-light">
-      <div class="container py-4">
-        <h2>Add Torrent Magnet</h2>
-        <form id="addForm" class="input-group mb-4">
-          <input type="text" id="magnet" class="form-control" placeholder="Paste magnet link" required />
-          <button class="btn btn-success" type="submit">Add Torrent</button>
-        </form>
-        <h2>Active Torrents (<span id="activeCount">0</span>)</h2>
-        <div id="active"></div>
-        <h2 class="mt-4">Completed Torrents (<span id="completedCount">0</span>)</h2>
-        <div id="completed"></div>
-      </div>
-      <script src="https://code.jquery.com/jquery-3.7.1.min.js"></script>
-      <script>
-        function refreshDashboard() {
-          $.get("/progress", function(data){
-            let activeHTML = '';
-            let activeCount = 0;
-            for(const mag in data.active){
-              activeCount++;
-              const info = data.active[mag];
-              const progress = info.progress || "0.00%";
-              const eta = info.eta || "Unknown";
-              const fileSize = info.file_size || "Unknown";
-              const peers = (info.peers !== undefined && info.peers !== null) ? info.peers : "N/A";
-              const speed = info.download_speed || "0 KB/s";
-              const status = info.status || "Unknown";
-              const prog = parseFloat(progress) || 0;
-              const logs = (info.logs || []).join('<br>');
-              activeHTML += `
-                <div class="torrent card shadow-sm mb-3">
-                  <div class="card-body">
-                    <div><strong>Status:</strong> ${status}</div>
-                    <div class="magnet-text text-muted mb-2">${mag}</div>
-                    <div><strong>Progress:</strong> ${progress}
-                    &nbsp;|&nbsp;<strong>ETA:</strong> ${eta}
-                    &nbsp;|&nbsp;<strong>Size:</strong> ${fileSize}
-                    &nbsp;|&nbsp;<strong>Peers:</strong> ${peers}
-                    &nbsp;|&nbsp;<strong>Speed:</strong> ${speed}</div>
-                    <div class="progress my-2">
-                      <div class="progress-bar bg-success progress-bar-striped progress-bar-animated"
-                           role="progressbar" style="width:${prog}%">${progress}</div>
-                    </div>
-                    <div class="log-box mb-2">${logs}</div>
-                    <button class="btn btn-danger btn-sm delete-btn" data-mag="${mag}">Cancel</button>
-                  </div>
-                </div>`;
-            }
-            $("#active").html(activeHTML || "<p class='text-muted'>No active downloads</p>");
-            $("#activeCount").text(activeCount);
-
-            let completedHTML = '';
-            let completedCount = 0;
-            for(const mag in data.completed){
-              data.completed[mag].forEach(f => {
-                completedCount++;
-                const fileName = f.file || "Unknown file";
-                const downloadUrl = f.download_url || "#";
-                completedHTML += `<div class="mb-1"><a class="btn btn-outline-success btn-sm" href="${downloadUrl}" target="_blank">${fileName}</a></div>`;
-              });
-            }
-            $("#completed").html(completedHTML || "<p class='text-muted'>No completed downloads</p>");
-            $("#completedCount").text(completedCount);
-
-            $('.delete-btn').off('click').on('click', function(){
-              let mag = $(this).data('mag');
-              $(this).prop('disabled', true).text('Cancelling...');
-              $.ajax({
-                type: "POST",
-                url: "/delete",
-                contentType: "application/json",
-                data: JSON.stringify({magnet: mag}),
-                success: function(){ refreshDashboard(); }
-              });
-            });
-          });
-        }
+def serve_asset(name, request, cache_control):
+    found = assets.lookup(name, request.headers.get("accept-encoding"))
+    if found is None:
+        return Response(status_code=404)
+    path, encoding = found
+    headers = {"cache-control": cache_control, "vary": "accept-encoding"}
+    if encoding:
+        headers["content-encoding"] = encoding
+    return RangeFileResponse(path, request, media_type=mimetypes.guess_type(name)[0], extra_headers=headers)
 
-        $("#addForm").submit(function(e){
-          e.preventDefault();
-          let mag = $("#magnet").val().trim();
-          if(mag){
-            $("button[type=submit]").prop('disabled', true).text('Adding...');
-            $.ajax({
-              type:"POST",
-              url:"/add",
-              contentType:"application/json",
-              data:JSON.stringify({magnet: mag}),
-              success:function(resp){
-                $("#magnet").val('');
-                $("button[type=submit]").prop('disabled', false).text('Add Torrent');
-                refreshDashboard();
-              }
-            });
-          }
-        });
-
-        setInterval(refreshDashboard, 4000);
-        refreshDashboard();
-      </script>
-    </body>
-    </html>
-    """
+@app.get("/dashboard")
+def dashboard(request: Request):
+    # Revalidated with its ETag; the assets it names are cached for good.
+    return serve_asset("dashboard.html", request, REVALIDATE)
+
+@app.get("/static/{name}")
+def static_asset(name: str, request: Request):
+    if name not in assets.hashed:
+        return Response(status_code=404)
+    return serve_asset(name, request, IMMUTABLE)
 
 @app.post("/add")
 async def add_torrent(request: Request):
     try:
-        data = await request.json()
-        magnet = data.get("magnet", "").strip()
-        if magnet.startswith("magnet:") and magnet not in active_downloads and magnet not in download_queue:
-            download_queue.append(magnet)
-            return {"added": True}
-        return {"added": False}
+        return await backend.command("add", data=await request.json())
     except Exception:
         return {"added": False}
 
+def parse_batch_line(line):
+    text = line.decode("utf-8", "replace").strip()
+    if text[:1] in ('{', '"'):
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
+    return text
+
+async def read_batch(request):
+    # JSON array (or {"magnets": [...]}) of magnets or {"magnet", "priority"}
+    # objects; any other content type is read as a stream of lines.
+    content_type = request.headers.get("content-type", "")
+    if "json" in content_type and "ndjson" not in content_type:
+        data = await request.json()
+        return data.get("magnets", []) if isinstance(data, dict) else data
+    items = []
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        items.extend(parse_batch_line(line) for line in lines if line.strip())
+    if pending.strip():
+        items.append(parse_batch_line(pending))
+    return items
+
+def batch_chunks(items):
+    chunk, size = [], 0
+    for item in items:
+        chunk.append(item)
+        size += len(dumps(item))
+        if size >= BATCH_COMMAND_BYTES:
+            yield chunk
+            chunk, size = [], 0
+    if chunk:
+        yield chunk
+
+@app.post("/add/batch")
+async def add_batch(request: Request, priority: int = 0):
+    try:
+        items = await read_batch(request)
+    except Exception:
+        return {"added": 0, "duplicate": 0, "rejected": 0, "results": [], "error": "Unreadable body"}
+    # All parts but the last are staged in the engine; the last commits the
+    # whole batch at once, so nothing is enqueued unless everything is.
+    chunks = list(batch_chunks(items if isinstance(items, list) else [])) or [[]]
+    batch = secrets.token_hex(8) if len(chunks) > 1 else None
+    try:
+        for chunk in chunks[:-1]:
+            await backend.command("stage_batch", batch=batch, items=chunk)
+        return await backend.command("add_batch", items=chunks[-1], priority=priority, batch=batch)
+    except CommandError as e:
+        return {"added": 0, "duplicate": 0, "rejected": 0, "results": [], "error": str(e)}
+
 @app.post("/delete")
 async def delete_torrent(request: Request):
     try:
-        data = await request.json()
-        magnet = data.get("magnet")
-        if magnet in downloading_tasks:
-            downloading_tasks[magnet].cancel()
-            active_downloads.pop(magnet, None)
-            downloading_tasks.pop(magnet, None)
-            add_log(magnet, "Cancelled by user")
-            return {"deleted": True}
-        if magnet in download_queue:
-            download_queue.remove(magnet)
-            return {"deleted": True}
-        return {"deleted": False}
+        return await backend.command("delete", data=await request.json())
     except Exception:
         return {"deleted": False}
 
+@app.get("/limits")
+async def get_limits():
+    return await backend.view("limits")
+
+@app.post("/limits")
+async def update_limits(request: Request):
+    # Bytes/s, 0 = unlimited. With a magnet/infohash the caps apply to that
+    # job (queued or active), otherwise to the whole session.
+    try:
+        return await backend.command("limits", data=await request.json())
+    except Exception:
+        return {"updated": False}
+
+@app.post("/recheck")
+async def request_recheck(request: Request):
+    # Verify the job's data on disk across VERIFY_WORKERS processes; runs on
+    # the job's next status tick once metadata is known.
+    try:
+        return await backend.command("recheck", data=await request.json())
+    except Exception:
+        return {"recheck": False}
+
+@app.post("/pause")
+async def pause_torrent(request: Request):
+    try:
+        return await backend.command("pause", data=await request.json())
+    except Exception:
+        return {"paused": False}
+
+@app.post("/resume")
+async def resume_torrent(request: Request):
+    try:
+        return await backend.command("resume", data=await request.json())
+    except Exception:
+        return {"resumed": False}
+
+@app.post("/priority")
+async def set_priority(request: Request):
+    try:
+        return await backend.command("priority", data=await request.json())
+    except Exception:
+        return {"updated": False}
+
+@app.get("/queue")
+async def get_queue(limit: int = 50):
+    return await backend.view("queue", limit=limit)
+
 @app.get("/progress")
-def get_progress():
-    return {"active": active_downloads, "completed": completed_files}
+async def get_progress(request: Request, since: int = None, status: str = None, sort: str = None,
+                       limit: int = None, cursor: str = None):
+    # With since=<version> only jobs changed after that version are sent;
+    # "removed" lists jobs that are no longer active. Cursors older than the
+    # change log (or from the future) get a full snapshot. Any of status,
+    # sort, limit or cursor asks for one page instead.
+    if status is not None or sort is not None or limit is not None or cursor is not None:
+        return await get_progress_page(request, status or "active", sort, limit or PAGE_LIMIT, cursor)
+    cursor = await backend.view("progress_cursor", since=since)
+    since = since if cursor["delta"] else None
+    etag = f'W/"{cursor["version"]}-{"full" if since is None else since}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"etag": etag})
+    payload = progress_payloads.get((cursor["version"], since))
+    if payload is None:
+        body = await backend.view("progress", since=since)
+        payload = progress_payloads.put((body["version"], since), json_payload(body))
+        etag = f'W/"{body["version"]}-{"full" if since is None else since}"'
+    return await json_response(request, payload, {"etag": etag})
+
+async def get_progress_page(request, status, sort, limit, cursor):
+    version = (await backend.view("progress_cursor"))["version"]
+    if request.headers.get("if-none-match") == f'W/"{version}-page"':
+        return Response(status_code=304, headers={"etag": f'W/"{version}-page"'})
+    key = (version, status, sort, limit, cursor)
+    payload = progress_payloads.get(key)
+    if payload is None:
+        try:
+            page = await backend.view("progress_page", status=status, sort=sort, limit=limit, cursor=cursor)
+        except ValueError as e:
+            return {"error": str(e)}
+        key = (page["version"], *key[1:])
+        payload = progress_payloads.put(key, json_payload(page))
+    return await json_response(request, payload, {"etag": f'W/"{key[0]}-page"'})
+
+@app.get("/progress/summary")
+async def get_progress_summary(request: Request):
+    version = (await backend.view("progress_cursor"))["version"]
+    etag = f'W/"{version}-summary"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"etag": etag})
+    payload = progress_payloads.get((version, "summary"))
+    if payload is None:
+        summary = await backend.view("summary")
+        payload = progress_payloads.put((summary["version"], "summary"), json_payload(summary))
+        etag = f'W/"{summary["version"]}-summary"'
+    return await json_response(request, payload, {"etag": etag})
+
+@app.get("/logs/{infohash}")
+async def get_logs(request: Request, infohash: str, since: int = 0, level: str = "debug", limit: int = LOG_RING_SIZE,
+                   tail: bool = False):
+    # Pages forward from since=; tail=true gives the latest `limit` instead.
+    logs = await backend.view("logs", infohash=infohash.lower(), since=since, level=level, limit=limit, tail=tail)
+    return await json_response(request, json_payload(logs))
+
+@app.get("/progress/stream")
+async def progress_stream(request: Request):
+    queue = asyncio.Queue(maxsize=1)
+    queue.put_nowait(sse_message(await stream_snapshot()))
+    progress_subscribers.add(queue)
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    yield await asyncio.wait_for(queue.get(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            progress_subscribers.discard(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/stream/{infohash}/{path:path}")
+async def stream_file(infohash: str, path: str, request: Request):
+    # Serves a torrent's file while it downloads, pulling the requested byte
+    # range forward with piece deadlines. Finished torrents are served from disk.
+    infohash = infohash.lower()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + STREAM_TIMEOUT
+    try:
+        info = await backend.command("stream_open", infohash=infohash, path=path)
+        while info["state"] == "pending":
+            if loop.time() >= deadline:
+                return Response(status_code=504)
+            await asyncio.sleep(0.2)
+            info = await backend.command("stream_open", infohash=infohash, path=path)
+    except CommandError:
+        return Response(status_code=503)
+    if info["state"] == "completed":
+        return RangeFileResponse(os.path.join(DOWNLOAD_DIR, path), request, filename=os.path.basename(path))
+    if info["state"] != "ready":
+        return Response(status_code=404)
+    span = info["span"]
+    size = span[2]
+    ranges = parse_range(request.headers["range"], size) if "range" in request.headers else None
+    headers = {"accept-ranges": "bytes"}
+    if ranges == []:
+        return Response(status_code=416, headers={"content-range": f"bytes */{size}"})
+    if ranges and len(ranges) == 1:
+        (start, end), status = ranges[0], 206
+        headers["content-range"] = f"bytes {start}-{end}/{size}"
+    else:
+        start, end, status = 0, size - 1, 200
+    if size == 0:
+        return Response(status_code=200, headers=headers)
+    # Wait for the first piece up front so a stalled torrent gets a 504
+    # rather than an empty 200.
+    first_piece = (span[1] + start) // span[3]
+    try:
+        await wait_piece(infohash, first_piece, first_piece)
+    except (asyncio.TimeoutError, KeyError, CommandError):
+        await close_stream(infohash)
+        return Response(status_code=504)
+    headers["content-length"] = str(end - start + 1)
+    return StreamingResponse(stream_pieces(infohash, span, start, end), status_code=status, headers=headers,
+                             media_type=mimetypes.guess_type(path)[0] or "application/octet-stream")
+
+@app.get("/metrics")
+async def get_metrics():
+    # Job and engine series come from the engine process; file bytes are
+    # counted by whichever worker served them, this one's live and the
+    # others' as last reported.
+    text = await backend.view("metrics")
+    workers = await backend.view("workers")
+    workers[str(os.getpid())] = {"file_bytes_served": stats["file_bytes_served"], "loop": loop_monitor.view()}
+    workers = sorted(workers.items())
+    out = [text.rstrip("\n")] if text else []
+    metrics.header(out, "torrent_file_served_bytes_total", "counter", "Bytes sent by /file and /stream.")
+    for pid, report in workers:
+        out.append(f'torrent_file_served_bytes_total{{pid="{pid}"}} {report["file_bytes_served"]}')
+    # API worker loops, next to the engine's torrent_loop_* series.
+    loops = [(pid, report["loop"]) for pid, report in workers if "loop" in report]
+    metrics.header(out, "torrent_api_loop_lag_seconds", "histogram", "API worker event loop wake-up lag.")
+    for pid, loop in loops:
+        metrics.histogram(out, "torrent_api_loop_lag_seconds", loop["lag"], f'pid="{pid}"')
+    metrics.header(out, "torrent_api_loop_blocked_seconds", "histogram",
+                   "Duration of callbacks that blocked an API worker's event loop.")
+    for pid, loop in loops:
+        metrics.histogram(out, "torrent_api_loop_blocked_seconds", loop["blocked"], f'pid="{pid}"')
+    metrics.header(out, "torrent_api_slow_callbacks_total", "counter",
+                   "Callbacks that blocked an API worker's event loop past the threshold.")
+    for pid, loop in loops:
+        out.append(f'torrent_api_slow_callbacks_total{{pid="{pid}"}} {loop["slow_callbacks_total"]}')
+    out.append("")
+    return PlainTextResponse("\n".join(out), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/debug/loop")
+async def get_loop_stats(limit: int = 20):
+    # The engine's loop, plus each API worker's under "workers" by pid.
+    loop = await backend.view("loop", limit=limit) or {}
+    workers = {pid: report["loop"] for pid, report in (await backend.view("workers")).items() if "loop" in report}
+    workers[str(os.getpid())] = loop_monitor.view(limit)
+    for worker in workers.values():
+        worker["slow_callbacks"] = worker["slow_callbacks"][:limit]
+    return {**loop, "workers": workers}
+
+@app.get("/concurrency")
+async def get_concurrency():
+    return await backend.view("concurrency")
 
 @app.get("/file/{filename}")
-def serve_file(filename: str):
+def serve_file(filename: str, request: Request):
     path = os.path.join(DOWNLOAD_DIR, filename)
     if os.path.exists(path):
-        return FileResponse(path, filename=filename)
+        return RangeFileResponse(path, request, filename=filename)
     return {"error": "File not found"}
     
@@ -0,0 +1,105 @@
+import gzip
+import hashlib
+import os
+import re
+import tempfile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Dashboard assets from static/, built once per process start: CSS/JS get
+# content-hashed names (so they can be cached forever), pages get those
+# names substituted for {{file}} placeholders, and everything is written
+# next to gzip and brotli variants so requests only pick a file to sendfile.
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+HASHED_TYPES = (".css", ".js")
+
+
+def negotiate(header, available):
+    # First of `available` (in server preference order) the client accepts,
+    # honouring q=0 and "*"; None means identity.
+    accepted = {}
+    for item in (header or "").split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        match = re.search(r"q\s*=\s*([0-9.]+)", params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    for encoding in available:
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def write_atomic(path, data):
+    # Workers build concurrently; each file appears whole or not at all.
+    # Unchanged files are left alone so their ETags survive restarts.
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return
+    except OSError:
+        pass
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class AssetBundle:
+    def __init__(self, source_dir, build_dir):
+        self.source_dir = source_dir
+        self.build_dir = build_dir
+        # served name -> {encoding or None: path}
+        self.files = {}
+        self.urls = {}
+        self.hashed = set()
+
+    def encodings(self):
+        return ("br", "gzip") if brotli else ("gzip",)
+
+    def emit(self, name, data):
+        variants = {None: os.path.join(self.build_dir, name)}
+        write_atomic(variants[None], data)
+        variants["gzip"] = variants[None] + ".gz"
+        write_atomic(variants["gzip"], gzip.compress(data, 9, mtime=0))
+        if brotli:
+            variants["br"] = variants[None] + ".br"
+            write_atomic(variants["br"], brotli.compress(data, quality=11))
+        self.files[name] = variants
+
+    def build(self):
+        os.makedirs(self.build_dir, exist_ok=True)
+        pages = []
+        for name in sorted(os.listdir(self.source_dir)):
+            with open(os.path.join(self.source_dir, name), "rb") as f:
+                data = f.read()
+            stem, ext = os.path.splitext(name)
+            if ext not in HASHED_TYPES:
+                pages.append((name, data))
+                continue
+            hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+            self.urls[name] = f"/static/{hashed}"
+            self.hashed.add(hashed)
+            self.emit(hashed, data)
+        for name, data in pages:
+            self.emit(name, re.sub(rb"\{\{([\w.-]+)\}\}",
+                                   lambda m: self.urls[m.group(1).decode()].encode(), data))
+        return self
+
+    def lookup(self, name, accept_encoding):
+        # (path, content-encoding) for the best variant, or None.
+        variants = self.files.get(name)
+        if variants is None:
+            return None
+        encoding = negotiate(accept_encoding, [e for e in self.encodings() if e in variants])
+        return variants[encoding], encoding
@@ -0,0 +1,240 @@
+import asyncio
+import base64
+import binascii
+import itertools
+import json
+import time
+
+import jobs
+from joblog import DEBUG, ERROR, INFO, WARNING, LogStore
+from statustable import SORT_KEYS, STATUS_KEYS, StatusReader
+
+
+# How an API worker reaches the engine process (jobs.py). Commands go over
+# its unix socket; reads never touch the engine: active statuses come from
+# the shared-memory status table, everything else from what the engine
+# publishes to the state store every PROGRESS_TICK.
+
+PAGE_LIMIT = 100
+# Seconds without a report before an API worker counts as gone.
+WORKER_STALE = 30
+MAX_PAGE_LIMIT = 1000
+# Sort keys of the completed catalog, by store column.
+COMPLETED_SORT_KEYS = {"completed": "completed_at", "name": "name"}
+
+
+class CommandError(Exception):
+    pass
+
+
+def encode_cursor(after):
+    return base64.urlsafe_b64encode(json.dumps(after).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, types):
+    # (value, infohash), the value being one of `types` as the sort key
+    # expects; a cursor from another sort is rejected.
+    try:
+        value, infohash = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError, TypeError):
+        raise ValueError("invalid cursor")
+    if not isinstance(infohash, str) or isinstance(value, bool) or not isinstance(value, types):
+        raise ValueError("invalid cursor")
+    return value, infohash
+
+
+class EngineClient:
+    def __init__(self, socket_path, table_path, store, spawn=None, timeout=10):
+        self.socket_path = socket_path
+        self.table = StatusReader(table_path)
+        self.store = store
+        # Called when nothing is listening, to start the engine process.
+        self.spawn = spawn
+        self.timeout = timeout
+        self.writer = None
+        self.connecting = None
+        self.replies = {}
+        self.ids = itertools.count(1)
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=jobs.COMMAND_LINE_LIMIT)
+                break
+            except OSError:
+                if loop.time() >= deadline:
+                    raise CommandError("engine process is not running")
+                if self.spawn:
+                    self.spawn()
+                await asyncio.sleep(0.2)
+        asyncio.create_task(self.read_replies(reader))
+        self.writer = writer
+
+    async def read_replies(self, reader):
+        try:
+            while line := await reader.readline():
+                reply = json.loads(line)
+                future = self.replies.pop(reply["id"], None)
+                if future is not None and not future.done():
+                    future.set_result(reply)
+        except (ConnectionError, ValueError):
+            pass
+        self.writer = None
+        for future in self.replies.values():
+            if not future.done():
+                future.set_exception(CommandError("engine process went away"))
+        self.replies.clear()
+
+    async def command(self, name, timeout=None, **args):
+        if self.writer is None:
+            # Concurrent callers share one connection attempt.
+            if self.connecting is None:
+                self.connecting = asyncio.create_task(self.connect())
+            try:
+                await asyncio.shield(self.connecting)
+            finally:
+                if self.connecting.done():
+                    self.connecting = None
+        command_id = next(self.ids)
+        line = json.dumps({"id": command_id, "name": name, "args": args}).encode() + b"\n"
+        if len(line) > jobs.COMMAND_LINE_LIMIT:
+            raise CommandError(f"{name}: command too large")
+        future = self.replies[command_id] = asyncio.get_running_loop().create_future()
+        self.writer.write(line)
+        try:
+            await self.writer.drain()
+            reply = await asyncio.wait_for(future, timeout or self.timeout)
+        except asyncio.TimeoutError:
+            raise CommandError(f"{name}: engine did not answer")
+        except ConnectionError:
+            raise CommandError("engine process went away")
+        finally:
+            self.replies.pop(command_id, None)
+        if "error" in reply:
+            raise CommandError(reply["error"])
+        return reply["ok"]
+
+    async def view(self, name, **args):
+        view = getattr(self, "view_" + name)
+        if name == "progress_cursor":
+            return view(**args)
+        return await asyncio.to_thread(view, **args)
+
+    def published(self, name, default):
+        value = self.store.published(name)
+        return default if value is None else value
+
+    def view_progress_cursor(self, since=None):
+        header = self.table.header()
+        if header is None:
+            return {"version": 0, "delta": False}
+        version, horizon = header
+        return {"version": version, "delta": since is not None and horizon <= since <= version}
+
+    def view_progress(self, since=None):
+        # The snapshot's version is read before its rows, so anything newer
+        # that slips into this answer is only repeated in the next delta.
+        snapshot = self.table.snapshot()
+        if snapshot is None:
+            version, active, removed, summary = 0, {}, [], None
+        else:
+            version, active, summary = snapshot.version, snapshot.records(since=since), snapshot.summary()
+            removed = snapshot.removed_since(since) if since is not None else []
+        changed = self.store.progress_since(since)
+        completed = {infohash: row["completed"] for infohash, row in changed if row.get("completed") is not None}
+        if since is None:
+            return {"version": version, "active": active, "completed": completed, "summary": summary}
+        # Jobs deleted from the completed catalog are removed too.
+        removed += [infohash for infohash, row in changed if row.get("completed") is None]
+        return {"version": version, "since": since, "active": active, "completed": completed, "removed": removed}
+
+    def view_progress_page(self, status="active", sort=None, limit=PAGE_LIMIT, cursor=None):
+        # One page of either the active torrents (all, or comma-separated
+        # STATUS_KEYS) or the completed catalog, in a stable keyset order so
+        # a cursor keeps its place while rows come and go.
+        descending = sort is None or sort.startswith("-")
+        limit = max(1, min(int(limit), MAX_PAGE_LIMIT))
+        if status == "completed":
+            key = (sort or "-completed").lstrip("-")
+            if key not in COMPLETED_SORT_KEYS:
+                raise ValueError(f"sort must be one of {', '.join(COMPLETED_SORT_KEYS)}")
+            column = COMPLETED_SORT_KEYS[key]
+            after = decode_cursor(cursor, str if key == "name" else (int, float)) if cursor else None
+            rows = self.store.completed_page(column, descending, after, limit + 1)
+            page = rows[:limit]
+            following = encode_cursor(page[-1][:2][::-1]) if len(rows) > limit else None
+            snapshot = self.table.snapshot()
+            return {
+                "version": snapshot.version if snapshot else 0,
+                "status": status, "sort": sort or "-completed",
+                "completed": {infohash: row["completed"] for infohash, _, row in page},
+                "next": following, "total": self.store.completed_count(),
+            }
+        statuses = None
+        if status != "active":
+            keys = status.split(",")
+            unknown = [key for key in keys if key not in STATUS_KEYS]
+            if unknown:
+                raise ValueError(f"status must be active, completed or one of {', '.join(STATUS_KEYS)}")
+            statuses = [STATUS_KEYS.index(key) for key in keys]
+        key = (sort or "-progress").lstrip("-")
+        if key not in SORT_KEYS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_KEYS)}")
+        after = decode_cursor(cursor, (int, float)) if cursor else None
+        snapshot = self.table.snapshot()
+        if snapshot is None:
+            version, active, following, total = 0, {}, None, 0
+        else:
+            version = snapshot.version
+            active, following, total = snapshot.select(statuses, key, descending, after, limit)
+        return {
+            "version": version, "status": status, "sort": sort or "-progress", "active": active,
+            "next": encode_cursor(following) if following else None, "total": total,
+        }
+
+    def view_summary(self):
+        # Counts and totals only, for clients that do not need every row.
+        snapshot = self.table.snapshot()
+        if snapshot is None:
+            version, summary = 0, {"active": 0}
+        else:
+            version, summary = snapshot.version, snapshot.summary()
+        return {"version": version, **summary, "queued": self.view_queue(0)["queued"],
+                "completed": self.store.completed_count()}
+
+    def view_logs(self, infohash, since=0, level="debug", limit=jobs.LOG_RING_SIZE, tail=False):
+        records = self.store.load_logs(infohash).get(infohash)
+        if records is None:
+            return {"infohash": infohash, "records": [], "next": since}
+        logs = LogStore(jobs.LOG_RING_SIZE, 1)
+        logs.restore(infohash, records)
+        levels = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+        records = logs.records(infohash, since, levels.get(level.lower(), DEBUG), limit, tail)
+        return {"infohash": infohash, "records": records, "next": records[-1]["seq"] if records else since}
+
+    def view_queue(self, limit=50):
+        queue = self.published("queue", {"queued": 0, "next": []})
+        return {"queued": queue["queued"], "next": queue["next"][:limit]}
+
+    def view_limits(self):
+        return self.published("limits", {"download_limit": 0, "upload_limit": 0, "torrents": {}})
+
+    def view_concurrency(self):
+        return self.published("concurrency", {"max_active_downloads": jobs.MAX_ACTIVE_DOWNLOADS})
+
+    def view_loop(self, limit=20):
+        loop = self.published("loop", None)
+        if loop is not None:
+            loop["slow_callbacks"] = loop["slow_callbacks"][:limit]
+        return loop
+
+    def view_workers(self):
+        # pid -> the latest report of each live API worker; see app.py.
+        now = time.time()
+        return {key.partition(":")[2]: doc for key, doc in self.store.published_prefix("worker:").items()
+                if now - doc.get("at", 0) < WORKER_STALE}
+
+    def view_metrics(self):
+        return self.published("metrics", "")
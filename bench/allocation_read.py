@@ -0,0 +1,76 @@
+"""Sequential read throughput of completed files per allocation mode.
+
+Simulates several torrents downloading in parallel: each file is written in
+random piece order, interleaved across files, either sparse or after an
+up-front fallocate (storage.preallocate). Each file is then evicted from the
+page cache with posix_fadvise and read back sequentially. Extent counts
+come from filefrag when it is installed. Point it at the disk under test.
+Run: python bench/allocation_read.py [dir] [files] [size_mb] [piece_kb]
+"""
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from storage import preallocate  # noqa: E402
+
+DIR = sys.argv[1] if len(sys.argv) > 1 else None
+FILES = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+SIZE = (int(sys.argv[3]) if len(sys.argv) > 3 else 256) * 1024 * 1024
+PIECE = (int(sys.argv[4]) if len(sys.argv) > 4 else 256) * 1024
+
+
+def write_interleaved(paths, mode):
+    if mode == "preallocate":
+        preallocate([(path, SIZE, False) for path in paths])
+    fds = [os.open(path, os.O_WRONLY | os.O_CREAT, 0o644) for path in paths]
+    writes = [(fd, piece * PIECE) for fd in fds for piece in range(SIZE // PIECE)]
+    random.Random(0).shuffle(writes)
+    block = os.urandom(PIECE)
+    for fd, offset in writes:
+        os.pwrite(fd, block, offset)
+    for fd in fds:
+        os.fsync(fd)
+        os.close(fd)
+
+
+def extents(path):
+    if not shutil.which("filefrag"):
+        return "n/a"
+    out = subprocess.run(["filefrag", path], capture_output=True, text=True).stdout
+    return out.rsplit(":", 1)[-1].split()[0] if ":" in out else "n/a"
+
+
+def read_sequential(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        start = time.perf_counter()
+        while os.read(fd, 1 << 20):
+            pass
+        return time.perf_counter() - start
+    finally:
+        os.close(fd)
+
+
+def main():
+    root = tempfile.mkdtemp(dir=DIR)
+    try:
+        for mode in ("sparse", "preallocate"):
+            paths = [os.path.join(root, f"{mode}-{i}.bin") for i in range(FILES)]
+            write_interleaved(paths, mode)
+            elapsed = sum(read_sequential(path) for path in paths)
+            print(f"{mode:12s} files={FILES} size={SIZE >> 20} MiB extents={extents(paths[0]):>6} "
+                  f"read={FILES * SIZE / elapsed / 2**20:8.1f} MiB/s")
+            for path in paths:
+                os.remove(path)
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Throughput of /file/{filename} for 1 and 50 concurrent clients.
+
+Starts uvicorn on a free port, writes a test file into DOWNLOAD_DIR and
+downloads it with raw asyncio sockets so the client is not the bottleneck.
+Run: python bench/file_throughput.py [size_mb] [clients...]
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from jobs import DOWNLOAD_DIR  # noqa: E402
+
+SIZE_MB = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+CLIENTS = [int(x) for x in sys.argv[2:]] or [1, 50]
+NAME = "bench-file-throughput.bin"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def fetch(port, headers=""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET /file/{NAME} HTTP/1.1\r\nHost: x\r\nConnection: close\r\n{headers}\r\n".encode())
+    await writer.drain()
+    total = 0
+    while True:
+        chunk = await reader.read(1 << 20)
+        if not chunk:
+            break
+        total += len(chunk)
+    writer.close()
+    return total
+
+
+async def wait_ready(port):
+    for _ in range(100):
+        try:
+            _, w = await asyncio.open_connection("127.0.0.1", port)
+            w.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+async def main():
+    path = os.path.join(ROOT, DOWNLOAD_DIR, NAME)
+    with open(path, "wb") as f:
+        f.truncate(SIZE_MB * 1024 * 1024)
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT)
+    try:
+        await wait_ready(port)
+        partial = await fetch(port, "Range: bytes=0-1023\r\n")
+        print(f"range sanity: {partial} bytes incl. headers for a 1 KiB range")
+        for n in CLIENTS:
+            start = time.perf_counter()
+            sizes = await asyncio.gather(*(fetch(port) for _ in range(n)))
+            elapsed = time.perf_counter() - start
+            print(f"clients={n:3d} total={sum(sizes) / 2**20:9.1f} MiB "
+                  f"time={elapsed:6.2f}s throughput={sum(sizes) / 2**20 / elapsed:8.1f} MiB/s")
+    finally:
+        server.terminate()
+        server.wait()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""Serialization and compression cost of /progress bodies.
+
+Builds a full /progress body (N active torrents from a real status table,
+plus N completed entries) and reports p50/p99 time and payload size for
+the stdlib JSON path the endpoint used before, the fast encoder, each
+content encoding when computed per request, and the cached path /progress
+takes for every request after the first per version.
+Run: python bench/progress_payload.py [repeats] [torrents...]
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from jobs import JobStatus  # noqa: E402
+from payload import ENCODINGS, Payload, compress, dumps  # noqa: E402
+from statustable import STATUS_NAMES, StatusReader, StatusWriter  # noqa: E402
+
+REPEATS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+SIZES = [int(x) for x in sys.argv[2:]] or [1000, 10000]
+
+
+def progress_body(torrents):
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        writer = StatusWriter(path, torrents, 1)
+        for i in range(torrents):
+            infohash = f"{i:040x}"
+            st = JobStatus(f"magnet:?xt=urn:btih:{infohash}&dn=Some.Release.Name.{i}&tr=udp://tracker.example:1337")
+            st.update(random.choice(STATUS_NAMES), random.uniform(0, 100), random.randint(0, 10 << 20),
+                      random.randint(0, 50), random.randint(1 << 20, 1 << 34))
+            writer.put(infohash, st, i + 2)
+        writer.publish(torrents + 1)
+        snapshot = StatusReader(path).snapshot()
+        completed = {f"{i:040x}ff": [{"file": f"Some.Release.Name.{i}/file.mkv",
+                                      "download_url": f"/file/Some.Release.Name.{i}/file.mkv"}]
+                     for i in range(torrents)}
+        body = {"version": snapshot.version, "active": snapshot.records(), "completed": completed,
+                "summary": snapshot.summary()}
+        writer.close()
+        return body
+    finally:
+        os.unlink(path)
+
+
+def percentiles(fn):
+    samples = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.99))], len(result)
+
+
+def row(label, stats):
+    p50, p99, size = stats
+    print(f"  {label:<28} p50={p50:8.2f} ms  p99={p99:8.2f} ms  size={size / 1024:9.1f} KiB")
+
+
+def main():
+    for torrents in SIZES:
+        body = progress_body(torrents)
+        print(f"torrents={torrents} (+{torrents} completed)")
+        row("stdlib json", percentiles(lambda: json.dumps(body).encode()))
+        row("fast encoder", percentiles(lambda: dumps(body)))
+        for encoding in ENCODINGS:
+            row(f"encode+{encoding} per request", percentiles(lambda: compress(dumps(body), encoding)))
+        payload = Payload(dumps(body))
+        loop = asyncio.new_event_loop()
+        for encoding in ENCODINGS:
+            loop.run_until_complete(payload.encoded(encoding))
+            row(f"cached {encoding}", percentiles(lambda: loop.run_until_complete(payload.render(encoding))[0]))
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
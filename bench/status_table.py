@@ -0,0 +1,87 @@
+"""Cost of reading fleet-wide status from the shared status table.
+
+Fills a table with N active torrents, then times what /progress does per
+published version: the column snapshot, the vectorized ETA/summary pass,
+one sort order and building the JSON-ready records. Also times the old
+per-torrent Python loop over status objects for comparison.
+Run: python bench/status_table.py [torrents] [repeats]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from jobs import JobStatus  # noqa: E402
+from statustable import STATUS_NAMES, StatusReader, StatusWriter  # noqa: E402
+
+TORRENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+REPEATS = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+
+def timed(fn):
+    samples = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def python_pass(statuses):
+    # What the per-torrent code did: ETA per job, then totals and a sort.
+    out = {}
+    total_rate = 0
+    for infohash, st in statuses.items():
+        eta = None
+        if st.download_rate > 100 and 0 < st.progress < 100 and st.total_size > 0:
+            eta = int(st.total_size * (100 - st.progress) / 100 / st.download_rate)
+        total_rate += st.download_rate
+        out[infohash] = {name: getattr(st, name) for name in JobStatus.__slots__}
+        out[infohash]["eta"] = eta
+    sorted(out, key=lambda key: out[key]["progress"])
+    return out
+
+
+def main():
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        writer = StatusWriter(path, TORRENTS, 1)
+        statuses = {}
+        for i in range(TORRENTS):
+            infohash = f"{i:040x}"
+            st = statuses[infohash] = JobStatus(f"magnet:?xt=urn:btih:{infohash}")
+            st.update(random.choice(STATUS_NAMES), random.uniform(0, 100), random.randint(0, 10 << 20),
+                      random.randint(0, 50), random.randint(1 << 20, 1 << 34))
+            writer.put(infohash, st, i + 2)
+        writer.publish(TORRENTS + 1)
+        reader = StatusReader(path)
+
+        def snapshot():
+            reader.cached = None
+            return reader.snapshot()
+
+        def full():
+            snap = snapshot()
+            snap.summary()
+            snap.records(snap.order("progress"))
+
+        print(f"torrents={TORRENTS}")
+        print(f"snapshot copy:            {timed(snapshot):8.2f} ms")
+        snap = snapshot()
+        print(f"eta+summary pass:         {timed(lambda: (setattr(snap, 'totals', None), snap.summary())):8.2f} ms")
+        print(f"sort by progress:         {timed(lambda: (snap.orders.clear(), snap.order('progress'))):8.2f} ms")
+        print(f"records (all rows):       {timed(lambda: snap.records()):8.2f} ms")
+        print(f"records (first 100):      {timed(lambda: snap.records(snap.order('progress')[:100])):8.2f} ms")
+        print(f"total per version:        {timed(full):8.2f} ms")
+        print(f"per-object python pass:   {timed(lambda: python_pass(statuses)):8.2f} ms")
+        writer.close()
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
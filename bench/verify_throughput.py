@@ -0,0 +1,45 @@
+"""Piece verification throughput (GB/s) versus worker count.
+
+Writes a random test file, builds its v1 piece hashes, then verifies it
+with verify.verify_pieces for each worker count. The first pass warms the
+page cache; use a file larger than RAM to measure cold-disk reads.
+Run: python bench/verify_throughput.py [size_mb] [piece_kb] [workers...]
+"""
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from verify import verify_pieces  # noqa: E402
+
+SIZE_MB = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+PIECE = (int(sys.argv[2]) if len(sys.argv) > 2 else 1024) * 1024
+WORKERS = [int(x) for x in sys.argv[3:]] or sorted({1, 2, 4, 8, os.cpu_count()})
+
+
+def main():
+    fd, path = tempfile.mkstemp(suffix=".bin")
+    hashes = []
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for _ in range(SIZE_MB * 1024 * 1024 // PIECE):
+                piece = os.urandom(PIECE)
+                hashes.append(hashlib.sha1(piece).digest())
+                f.write(piece)
+        files = [(path, len(hashes) * PIECE, False)]
+        verify_pieces(files, PIECE, hashes, 1)  # warm the page cache
+        for workers in WORKERS:
+            start = time.perf_counter()
+            have = verify_pieces(files, PIECE, hashes, workers)
+            elapsed = time.perf_counter() - start
+            assert all(have)
+            print(f"workers={workers:3d} time={elapsed:6.2f}s "
+                  f"throughput={len(hashes) * PIECE / elapsed / 1e9:6.2f} GB/s")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
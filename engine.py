@@ -0,0 +1,345 @@
+import asyncio
+import os
+import time
+
+try:
+    import libtorrent as lt
+except ImportError:
+    lt = None
+
+# libtorrent 2.0+: add a torrent without checking its files on disk.
+NO_VERIFY_FILES = getattr(lt.torrent_flags, "no_verify_files", None) if lt else None
+
+
+class TorrentEngine:
+    # One long-lived libtorrent session shared by every download. A job is
+    # just a handle in it, so the listen socket, DHT node and disk threads
+    # are set up once and peer discovery reuses the warm routing table.
+    #
+    # Statuses are collected for all torrents at once with
+    # post_torrent_updates() instead of one status() call per torrent.
+    #
+    # Fast-resume data is written to resume_dir/<infohash>.fastresume
+    # periodically, when a torrent is removed and on shutdown, and is fed
+    # back to add_torrent so restarted jobs skip the full recheck.
+    def __init__(self, save_path, listen_interfaces, resume_dir, resume_interval=60):
+        self.save_path = save_path
+        self.listen_interfaces = listen_interfaces
+        self.resume_dir = resume_dir
+        self.resume_interval = resume_interval
+        self.session = None
+        self.handles = {}
+        self.keys = {}
+        self.statuses = {}
+        # infohash -> Event set when the torrent finishes; see wait_finished
+        self.finished = {}
+        # handle -> infohash for torrents waiting on resume data before removal
+        self.removing = {}
+        self.pending_saves = 0
+        # Bytes/s, 0 = unlimited; per-torrent ones are re-applied on re-add.
+        self.global_limits = (0, 0)
+        self.limits = {}
+        # infohash -> "sparse" | "preallocate"
+        self.storage = {}
+        os.makedirs(resume_dir, exist_ok=True)
+
+    @property
+    def available(self):
+        return lt is not None
+
+    def start(self):
+        if lt is None or self.session is not None:
+            return
+        self.session = lt.session({
+            "listen_interfaces": self.listen_interfaces,
+            "enable_dht": True,
+            "enable_lsd": True,
+            "alert_mask": (lt.alert.category_t.status_notification
+                           | lt.alert.category_t.error_notification
+                           | lt.alert.category_t.storage_notification),
+            "download_rate_limit": self.global_limits[0],
+            "upload_rate_limit": self.global_limits[1],
+        })
+
+    def set_global_limits(self, download, upload):
+        self.global_limits = (download, upload)
+        if self.session is not None:
+            self.session.apply_settings({"download_rate_limit": download, "upload_rate_limit": upload})
+
+    def set_limits(self, infohash, download, upload):
+        handle = self.handles.get(infohash)
+        if handle is not None:
+            self.limits[infohash] = (download, upload)
+            self.apply_limits(infohash, handle)
+
+    def apply_limits(self, infohash, handle):
+        download, upload = self.limits.get(infohash, (0, 0))
+        handle.set_download_limit(download if download > 0 else -1)
+        handle.set_upload_limit(upload if upload > 0 else -1)
+
+    def stop(self, timeout=10):
+        if self.session is None:
+            return
+        self.session.pause()
+        for handle in list(self.keys):
+            self.save_resume(handle)
+        deadline = time.monotonic() + timeout
+        while self.pending_saves > 0 and time.monotonic() < deadline:
+            self.session.wait_for_alert(500)
+            self.handle_alerts()
+
+    def resume_path(self, infohash):
+        return os.path.join(self.resume_dir, f"{infohash}.fastresume")
+
+    def load_resume(self, infohash):
+        try:
+            with open(self.resume_path(infohash), "rb") as f:
+                return lt.read_resume_data(f.read())
+        except Exception:
+            return None
+
+    def write_resume(self, infohash, params):
+        path = self.resume_path(infohash)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(lt.write_resume_data_buf(params))
+        os.replace(tmp, path)
+
+    def discard_resume(self, infohash):
+        try:
+            os.remove(self.resume_path(infohash))
+        except FileNotFoundError:
+            pass
+
+    def save_resume(self, handle):
+        handle.save_resume_data(lt.torrent_handle.save_info_dict)
+        self.pending_saves += 1
+
+    def storage_mode(self, infohash):
+        if self.storage.get(infohash) == "preallocate":
+            return lt.storage_mode_t.storage_mode_allocate
+        return lt.storage_mode_t.storage_mode_sparse
+
+    def add(self, infohash, magnet, limits=(0, 0), storage="sparse"):
+        # Returns True when there was no resume data and libtorrent was told
+        # not to check files already on disk; the caller verifies them (with
+        # verify.py, across cores) once metadata is known.
+        self.limits[infohash] = limits
+        self.storage[infohash] = storage
+        handle = self.reclaim(infohash)
+        if handle is not None:
+            self.register(infohash, handle)
+            return False
+        resume = self.load_resume(infohash)
+        if resume is not None:
+            # Resume data keeps the flags the torrent was saved with, a user
+            # pause or a recheck included; whether the job is paused is up
+            # to the caller.
+            if resume.flags & lt.torrent_flags.paused:
+                resume.flags ^= lt.torrent_flags.paused
+            resume.flags |= lt.torrent_flags.auto_managed
+        params = resume or lt.parse_magnet_uri(magnet)
+        params.save_path = self.save_path
+        params.storage_mode = self.storage_mode(infohash)
+        unchecked = resume is None and NO_VERIFY_FILES is not None
+        if unchecked:
+            params.flags |= NO_VERIFY_FILES
+        self.register(infohash, self.session.add_torrent(params))
+        return unchecked
+
+    def register(self, infohash, handle):
+        self.handles[infohash] = handle
+        self.keys[handle] = infohash
+        self.apply_limits(infohash, handle)
+        self.statuses[infohash] = handle.status()
+
+    def reclaim(self, infohash):
+        # A torrent added again while its removal still waits on resume data
+        # (delete then re-add, stall retry) is kept in the session rather
+        # than added twice; its resume data, when it comes, is saved as
+        # usual. It keeps the storage mode it was added with.
+        for handle, key in self.removing.items():
+            if key == infohash:
+                del self.removing[handle]
+                if not handle.is_valid():
+                    return None
+                handle.set_flags(lt.torrent_flags.auto_managed)
+                handle.resume()
+                return handle
+        return None
+
+    def remove(self, infohash, keep_resume=True):
+        # With keep_resume the torrent stays in the session until its resume
+        # data has been written; see handle_alerts.
+        handle = self.handles.pop(infohash, None)
+        self.statuses.pop(infohash, None)
+        self.finished.pop(infohash, None)
+        self.limits.pop(infohash, None)
+        self.storage.pop(infohash, None)
+        if handle is None:
+            return
+        self.keys.pop(handle, None)
+        if keep_resume and handle.is_valid():
+            self.removing[handle] = infohash
+            self.save_resume(handle)
+        else:
+            self.discard_resume(infohash)
+            self.session.remove_torrent(handle)
+
+    def status(self, infohash):
+        return self.statuses.get(infohash)
+
+    def files(self, infohash):
+        info = self.handles[infohash].torrent_file()
+        if info is None:
+            return []
+        storage = info.files()
+        return [storage.file_path(i) for i in range(storage.num_files())]
+
+    def file_list(self, infohash):
+        # [(absolute path, size, is_pad)] or None without metadata.
+        info = self.handles[infohash].torrent_file()
+        if info is None:
+            return None
+        storage = info.files()
+        return [(storage.file_path(i, self.save_path), storage.file_size(i), storage.pad_file_at(i))
+                for i in range(storage.num_files())]
+
+    def layout(self, infohash):
+        # (files, piece_length, v1 piece hashes) for external verification,
+        # or None without metadata or for v2-only torrents.
+        info = self.handles[infohash].torrent_file()
+        if info is None:
+            return None
+        hashes_of = getattr(info, "info_hashes", None)
+        if hashes_of is not None and not hashes_of().has_v1():
+            return None
+        files = self.file_list(infohash)
+        hashes = []
+        for i in range(info.num_pieces()):
+            digest = info.hash_for_piece(i)
+            hashes.append(digest if isinstance(digest, bytes) else digest.to_bytes())
+        return files, info.piece_length(), hashes
+
+    def file_span(self, infohash, path):
+        # (absolute path, offset in torrent, size, piece length) of a file
+        # in the torrent, or None if unknown.
+        info = self.handles[infohash].torrent_file()
+        if info is None:
+            return None
+        storage = info.files()
+        for i in range(storage.num_files()):
+            if storage.file_path(i) == path and not storage.pad_file_at(i):
+                return (storage.file_path(i, self.save_path), storage.file_offset(i),
+                        storage.file_size(i), info.piece_length())
+        return None
+
+    def has_piece(self, infohash, piece):
+        return self.handles[infohash].have_piece(piece)
+
+    def set_deadlines(self, infohash, first, last, step_ms):
+        # Deadline piece picking: first..last are requested ahead of the
+        # regular rarest-first order, earliest first.
+        handle = self.handles[infohash]
+        for n, piece in enumerate(range(first, last + 1)):
+            if not handle.have_piece(piece):
+                handle.set_piece_deadline(piece, step_ms * (n + 1))
+
+    def clear_deadlines(self, infohash):
+        handle = self.handles.get(infohash)
+        if handle is not None and handle.is_valid():
+            handle.clear_piece_deadlines()
+
+    async def wait_piece(self, infohash, piece, timeout, poll=0.1):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            if infohash not in self.handles:
+                raise KeyError(infohash)
+            if self.has_piece(infohash, piece):
+                return
+            if loop.time() >= deadline:
+                raise asyncio.TimeoutError
+            await asyncio.sleep(poll)
+
+    async def wait_finished(self, infohash, timeout):
+        # Sleeps up to `timeout`, returning early once the torrent finishes,
+        # so a completed job frees its slot within an engine tick.
+        event = self.finished.setdefault(infohash, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        event.clear()
+
+    def pause(self, infohash):
+        # Out of auto-management, or the session's queueing would resume it.
+        handle = self.handles[infohash]
+        handle.unset_flags(lt.torrent_flags.auto_managed)
+        handle.pause()
+
+    def resume(self, infohash):
+        handle = self.handles[infohash]
+        handle.set_flags(lt.torrent_flags.auto_managed)
+        handle.resume()
+
+    def adopt(self, infohash, have):
+        # Re-add the torrent with an externally verified piece bitfield so
+        # libtorrent trusts it instead of hashing everything again.
+        handle = self.handles[infohash]
+        params = lt.add_torrent_params()
+        params.ti = handle.torrent_file()
+        params.save_path = self.save_path
+        params.storage_mode = self.storage_mode(infohash)
+        params.have_pieces = have
+        if NO_VERIFY_FILES is not None:
+            params.flags |= NO_VERIFY_FILES
+        self.keys.pop(handle, None)
+        self.session.remove_torrent(handle)
+        self.register(infohash, self.session.add_torrent(params))
+
+    def handle_alerts(self):
+        for alert in self.session.pop_alerts():
+            if isinstance(alert, lt.state_update_alert):
+                for st in alert.status:
+                    infohash = self.keys.get(st.handle)
+                    if infohash is not None:
+                        self.statuses[infohash] = st
+                        if st.is_finished and infohash in self.finished:
+                            self.finished[infohash].set()
+            elif isinstance(alert, lt.torrent_finished_alert):
+                infohash = self.keys.get(alert.handle)
+                if infohash is not None:
+                    # Fresh, so the waiter sees is_finished before the next
+                    # round of state updates.
+                    self.statuses[infohash] = alert.handle.status()
+                    if infohash in self.finished:
+                        self.finished[infohash].set()
+            elif isinstance(alert, (lt.save_resume_data_alert, lt.save_resume_data_failed_alert)):
+                self.pending_saves -= 1
+                handle = alert.handle
+                infohash = self.keys.get(handle) or self.removing.get(handle)
+                if infohash is not None and isinstance(alert, lt.save_resume_data_alert):
+                    self.write_resume(infohash, alert.params)
+                if self.removing.pop(handle, None) is not None:
+                    self.session.remove_torrent(handle)
+
+    def poll(self):
+        self.session.post_torrent_updates()
+        self.handle_alerts()
+
+    def checkpoint(self):
+        for handle in list(self.keys):
+            if handle.need_save_resume_data():
+                self.save_resume(handle)
+
+    async def run(self, interval):
+        last_checkpoint = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            if self.session is None:
+                continue
+            if time.monotonic() - last_checkpoint >= self.resume_interval:
+                last_checkpoint = time.monotonic()
+                self.checkpoint()
+            self.poll()
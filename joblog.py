@@ -0,0 +1,73 @@
+import itertools
+import time
+from collections import OrderedDict, deque
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: "debug", INFO: "info", WARNING: "warning", ERROR: "error"}
+
+
+class LogStore:
+    # Per-job ring buffers of compact (seq, ts, level, fmt, args) records.
+    # Messages are only %-formatted when read. seq is global and monotonic so
+    # readers can page with since=. Jobs beyond max_jobs are evicted least
+    # recently logged first, except those keep(job) says are still running:
+    # max_jobs bounds the finished and cancelled ones, the running ones are
+    # bounded by the scheduler. Evictions run in batches, a full pass once
+    # another max_jobs/4 jobs have arrived.
+    def __init__(self, ring_size, max_jobs, on_evict=None, keep=None):
+        self.ring_size = ring_size
+        self.max_jobs = max_jobs
+        self.on_evict = on_evict
+        self.keep = keep
+        self.next_evict = max_jobs
+        self.jobs = OrderedDict()
+        self.seq = itertools.count(1)
+
+    def add(self, job, level, fmt, args):
+        ring = self.jobs.get(job)
+        if ring is None:
+            ring = self.jobs[job] = deque(maxlen=self.ring_size)
+            if len(self.jobs) > self.next_evict:
+                self.evict()
+        else:
+            self.jobs.move_to_end(job)
+        ring.append((next(self.seq), time.time(), level, fmt, args))
+        return ring
+
+    def evict(self):
+        candidates = [job for job in self.jobs if self.keep is None or not self.keep(job)]
+        for job in candidates[:max(0, len(candidates) - self.max_jobs)]:
+            del self.jobs[job]
+            if self.on_evict:
+                self.on_evict(job)
+        self.next_evict = len(self.jobs) + max(1, self.max_jobs // 4)
+
+    def records(self, job, since=0, level=0, limit=None, tail=False):
+        # The first `limit` records after `since`, so paging with since=<last
+        # seq> misses nothing; with tail, the last `limit` instead.
+        ring = self.jobs.get(job, ())
+        out = [r for r in ring if r[0] > since and r[2] >= level]
+        if limit is not None:
+            out = out[-limit:] if tail else out[:limit]
+        return [format_record(r) for r in out]
+
+    def __contains__(self, job):
+        return job in self.jobs
+
+    def restore(self, job, records):
+        ring = self.jobs[job] = deque(maxlen=self.ring_size)
+        for record in records:
+            if isinstance(record, list) and len(record) == 5:
+                ring.append((record[0], record[1], record[2], record[3], tuple(record[4])))
+        if ring:
+            self.seq = itertools.count(max(next(self.seq), ring[-1][0] + 1))
+
+
+def format_record(record):
+    seq, ts, level, fmt, args = record
+    return {
+        "seq": seq,
+        "time": ts,
+        "level": LEVEL_NAMES.get(level, str(level)),
+        "message": fmt % args if args else fmt,
+    }
@@ -0,0 +1,63 @@
+import heapq
+import itertools
+import time
+
+
+class JobQueue:
+    # Priority queue of pending downloads keyed by infohash.
+    #
+    # The heap key is enqueued_at - priority * aging: each priority level is
+    # worth `aging` seconds of waiting, so an old low-priority job eventually
+    # sorts ahead of newer urgent ones without ever re-keying the heap.
+    # remove/reprioritize invalidate the old entry in place (lazy deletion),
+    # keeping push, pop and reprioritize O(log n).
+    def __init__(self, aging):
+        self.aging = aging
+        self.heap = []
+        self.entries = {}
+        self.seq = itertools.count()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, infohash):
+        return infohash in self.entries
+
+    def push(self, infohash, magnet, priority=0, enqueued_at=None):
+        if infohash in self.entries:
+            self.remove(infohash)
+        if enqueued_at is None:
+            enqueued_at = time.time()
+        # [key, seq, infohash, magnet, priority, enqueued_at, live]
+        entry = [enqueued_at - priority * self.aging, next(self.seq), infohash, magnet, priority, enqueued_at, True]
+        self.entries[infohash] = entry
+        heapq.heappush(self.heap, entry)
+
+    def pop(self):
+        while self.heap:
+            entry = heapq.heappop(self.heap)
+            if entry[6]:
+                del self.entries[entry[2]]
+                return entry[2], entry[3], entry[5]
+        raise KeyError("pop from an empty queue")
+
+    def remove(self, infohash):
+        entry = self.entries.pop(infohash)
+        entry[6] = False
+        # Drop dead entries once they dominate the heap.
+        if len(self.heap) > 64 and len(self.heap) > 2 * len(self.entries):
+            self.heap = [e for e in self.heap if e[6]]
+            heapq.heapify(self.heap)
+        return entry
+
+    def reprioritize(self, infohash, priority):
+        entry = self.remove(infohash)
+        self.push(infohash, entry[3], priority, entry[5])
+
+    def get(self, infohash):
+        entry = self.entries[infohash]
+        return {"magnet": entry[3], "priority": entry[4], "enqueued_at": entry[5]}
+
+    def head(self, n):
+        # The next n jobs in pop order.
+        return [(e[2], self.get(e[2])) for e in heapq.nsmallest(n, self.entries.values())]
@@ -0,0 +1,855 @@
+import asyncio
+import base64
+import binascii
+import fcntl
+import hashlib
+import json
+import os
+import signal
+import time
+from urllib.parse import parse_qsl
+
+import metrics
+from engine import TorrentEngine
+from jobqueue import JobQueue
+from joblog import DEBUG, ERROR, INFO, WARNING, LogStore
+from loopmon import LoopMonitor
+from statustable import StatusWriter
+from storage import STORAGE_MODES, existing_files, preallocate
+from store import StateStore
+from verify import verify_pieces_async
+
+# Job core: queue, scheduler, engine and all job state. It runs in its own
+# engine process (python jobs.py, started on demand by the API); see
+# backend.py for how API workers reach it.
+
+DOWNLOAD_DIR = './downloads'
+os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+MAX_ACTIVE_DOWNLOADS = 2  # starting point; the tuner moves it at runtime
+MIN_ACTIVE_DOWNLOADS = 1
+ACTIVE_DOWNLOADS_CEILING = 32
+TUNE_INTERVAL = 15
+PROGRESS_TICK = 3
+STATE_DB = './state.db'
+STORE_FLUSH_INTERVAL = 2
+PRIORITY_AGING = 60  # seconds of waiting worth one priority level
+ENGINE_LISTEN = '0.0.0.0:6881,[::]:6881'
+ENGINE_TICK = 1
+RESUME_DIR = './resume'
+RESUME_INTERVAL = 60
+VERIFY_WORKERS = os.cpu_count()
+SLOW_CALLBACK_THRESHOLD = 0.1
+LOG_RING_SIZE = 100
+LOG_MAX_JOBS = 1000  # finished and cancelled jobs; running ones always keep theirs
+ENGINE_LOCK = './engine.lock'
+ENGINE_SOCKET = './engine.sock'
+# Named after the state database, so instances in different directories on
+# one host (each with its own lock and socket) never share a table.
+STATUS_TABLE = (f"/dev/shm/torrent-status-{hashlib.sha1(os.path.abspath(STATE_DB).encode()).hexdigest()[:16]}"
+                if os.path.isdir('/dev/shm') else './status.table')
+STATUS_SLOTS = 65536  # active plus recently removed torrents; ~2.2 KB each, touched only when used
+COMMAND_LINE_LIMIT = 16 * 1024 * 1024
+STORAGE_MODE = 'sparse'  # default for jobs added without "storage"; see storage.STORAGE_MODES
+BATCH_STAGE_TIMEOUT = 600
+CPU_BUSY_LIMIT = 0.90
+DISK_BUSY_LIMIT = 0.90
+
+# All job state is keyed by infohash; magnets maps it back to the URI.
+download_queue = JobQueue(PRIORITY_AGING)
+magnets = {}
+# infohash -> (download, upload) bytes/s caps, 0 = unlimited
+job_limits = {}
+# infohash -> storage mode, only for jobs that differ from STORAGE_MODE
+job_storage = {}
+active_downloads = {}
+completed_files = {}
+downloading_tasks = {}
+max_active_downloads = MAX_ACTIVE_DOWNLOADS
+tuner_state = {}
+recheck_requests = set()
+paused = set()
+# batch id -> (last staged at, items); see cmd_stage_batch
+staged_batches = {}
+# Monotonic state version; seeded from the clock so cursors stay valid
+# across restarts.
+state_version = int(time.time() * 1000)
+# infohash -> version of its last change, since the last publish
+unpublished = {}
+# Active statuses as read by the API workers; created by start()
+status_table = None
+stats = {"stall_cancellations": 0}
+queue_wait = metrics.Histogram([0.01, 0.1, 1, 10, 60, 300, 1800, 3600, 21600, 86400])
+store = StateStore(STATE_DB)
+job_logs = LogStore(LOG_RING_SIZE, LOG_MAX_JOBS, on_evict=lambda infohash: store.delete("logs", infohash),
+                    keep=lambda infohash: infohash in downloading_tasks)
+loop_monitor = LoopMonitor(threshold=SLOW_CALLBACK_THRESHOLD)
+engine = TorrentEngine(DOWNLOAD_DIR, ENGINE_LISTEN, RESUME_DIR, RESUME_INTERVAL)
+scheduler_event = asyncio.Event()
+
+def claim_engine(path):
+    # Returns the open lock file while this process owns the engine, None if
+    # another process does. The lock goes away with the process.
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    os.ftruncate(fd, 0)
+    os.write(fd, str(os.getpid()).encode())
+    return fd
+
+def add_log(infohash, message, *args, level=INFO):
+    ring = job_logs.add(infohash, level, message, args)
+    store.append_log(infohash, ring[-1], ring[0][0])
+
+class JobStatus:
+    # Raw numbers, updated in place every tick and copied into the status
+    # table by touch(); formatting is left to clients.
+    __slots__ = ("magnet", "status", "progress", "download_rate", "peers", "total_size",
+                 "download_limit", "upload_limit")
+
+    def __init__(self, magnet, limits=(0, 0)):
+        self.magnet = magnet
+        self.download_limit, self.upload_limit = limits
+        self.status = "Connecting to peers..."
+        self.progress = 0.0
+        self.download_rate = 0
+        self.peers = 0
+        self.total_size = 0
+
+    def update(self, status, progress, download_rate, peers, total_size):
+        new = (status, progress, download_rate, peers, total_size)
+        if new == (self.status, self.progress, self.download_rate, self.peers, self.total_size):
+            return False
+        self.status, self.progress, self.download_rate, self.peers, self.total_size = new
+        return True
+
+def touch(infohash):
+    global state_version
+    state_version += 1
+    unpublished[infohash] = state_version
+    status = active_downloads.get(infohash)
+    if status is None:
+        status_table.remove(infohash, state_version)
+    else:
+        status_table.put(infohash, status, state_version)
+
+def queue_changed():
+    # The queue is published with the views, not per job; a new version still
+    # tells readers (and their caches and streams) that something changed.
+    global state_version
+    state_version += 1
+
+def set_active(infohash, magnet):
+    active_downloads[infohash] = status = JobStatus(magnet, job_limits.get(infohash, (0, 0)))
+    touch(infohash)
+    # Only the magnet is needed to requeue the job after a restart.
+    store.put("active", infohash, {"magnet": magnet})
+    return status
+
+def drop_active(infohash):
+    if active_downloads.pop(infohash, None) is not None:
+        touch(infohash)
+    store.delete("active", infohash)
+
+def parse_infohash(magnet):
+    # Lowercase hex of the v1 (btih, hex or base32) hash, else the v2 (btmh)
+    # multihash, so magnets differing only in tr=/dn= share a key.
+    if not magnet.startswith("magnet:?"):
+        return None
+    v2 = None
+    for key, value in parse_qsl(magnet[8:]):
+        if key != "xt":
+            continue
+        urn = value[:9].lower()
+        digest = value[9:]
+        if urn == "urn:btih:":
+            if len(digest) == 40:
+                try:
+                    return bytes.fromhex(digest).hex()
+                except ValueError:
+                    continue
+            if len(digest) == 32:
+                try:
+                    return base64.b32decode(digest.upper()).hex()
+                except binascii.Error:
+                    continue
+        elif urn == "urn:btmh:" and len(digest) == 68 and digest.lower().startswith("1220"):
+            try:
+                v2 = bytes.fromhex(digest).hex()
+            except ValueError:
+                continue
+    return v2
+
+def resolve_job(value):
+    # Accepts a magnet or a bare infohash.
+    value = (value or "").strip()
+    if value.startswith("magnet:"):
+        return parse_infohash(value)
+    value = value.lower()
+    return value if value in magnets or value in completed_files else None
+
+def is_known(infohash):
+    return infohash in download_queue or infohash in downloading_tasks or infohash in completed_files
+
+def parse_limits(data, current=(0, 0)):
+    # Missing keys keep the current value; negative values mean unlimited.
+    download = int(data.get("download_limit", current[0]) or 0)
+    upload = int(data.get("upload_limit", current[1]) or 0)
+    return max(0, download), max(0, upload)
+
+def set_job_limits(infohash, limits):
+    if limits == (0, 0):
+        job_limits.pop(infohash, None)
+        store.delete("limits", infohash)
+    else:
+        job_limits[infohash] = limits
+        store.put("limits", infohash, list(limits))
+    engine.set_limits(infohash, *limits)
+    status = active_downloads.get(infohash)
+    if status is not None and (status.download_limit, status.upload_limit) != limits:
+        status.download_limit, status.upload_limit = limits
+        touch(infohash)
+
+def set_job_storage(infohash, mode):
+    if mode == STORAGE_MODE:
+        job_storage.pop(infohash, None)
+        store.delete("storage", infohash)
+    else:
+        job_storage[infohash] = mode
+        store.put("storage", infohash, mode)
+
+def wake_scheduler():
+    scheduler_event.set()
+
+def enqueue(infohash, magnet, priority=0, enqueued_at=None):
+    download_queue.push(infohash, magnet, priority, enqueued_at)
+    magnets[infohash] = magnet
+    store.put("queue", infohash, download_queue.get(infohash))
+    queue_changed()
+    wake_scheduler()
+
+async def download_worker():
+    # Woken on enqueue, completion, cancel and failure; no polling.
+    while True:
+        await scheduler_event.wait()
+        scheduler_event.clear()
+        # Count tasks, not active_downloads: a freshly created task has not
+        # registered itself there yet.
+        while len(downloading_tasks) < max_active_downloads and download_queue:
+            infohash, magnet, enqueued_at = download_queue.pop()
+            # Jobs restored after a restart carry enqueued_at=0; skip them.
+            if enqueued_at > 0:
+                queue_wait.observe(max(0.0, time.time() - enqueued_at))
+            store.delete("queue", infohash)
+            queue_changed()
+            task = asyncio.create_task(handle_download(infohash, magnet))
+            downloading_tasks[infohash] = task
+
+def read_cpu_times():
+    # (busy, total) jiffies from the aggregate cpu line of /proc/stat
+    try:
+        with open('/proc/stat') as f:
+            fields = [int(x) for x in f.readline().split()[1:]]
+    except (OSError, ValueError):
+        return None
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0)
+    total = sum(fields[:8])
+    return total - idle, total
+
+def read_disk_stats():
+    # (bytes written, busiest device io_ms) over whole block devices only,
+    # so partitions are not counted twice.
+    written = 0
+    io_ms = {}
+    try:
+        with open('/proc/diskstats') as f:
+            for line in f:
+                parts = line.split()
+                name = parts[2]
+                if name.startswith(('loop', 'ram')) or not os.path.exists(f'/sys/block/{name}'):
+                    continue
+                written += int(parts[9]) * 512
+                io_ms[name] = int(parts[12])
+    except (OSError, ValueError, IndexError):
+        return None
+    return written, io_ms
+
+def sample_system():
+    return asyncio.get_running_loop().time(), read_cpu_times(), read_disk_stats()
+
+async def concurrency_tuner():
+    # Hill climbing on aggregate download rate: keep stepping up while total
+    # throughput improves, step back when it stops or CPU/disk saturate.
+    global max_active_downloads
+    prev = sample_system()
+    last_rate = 0
+    last_step = 0
+    idle_ticks = 0
+    while True:
+        await asyncio.sleep(TUNE_INTERVAL)
+        cur = sample_system()
+        elapsed = cur[0] - prev[0]
+        cpu = disk_util = 0.0
+        disk_write = 0
+        if cur[1] and prev[1] and cur[1][1] > prev[1][1]:
+            cpu = (cur[1][0] - prev[1][0]) / (cur[1][1] - prev[1][1])
+        if cur[2] and prev[2] and elapsed > 0:
+            disk_write = (cur[2][0] - prev[2][0]) / elapsed
+            disk_util = max(
+                ((ms - prev[2][1].get(dev, ms)) / 1000 / elapsed for dev, ms in cur[2][1].items()),
+                default=0.0)
+        prev = cur
+        rate = sum(status.download_rate for status in active_downloads.values())
+        limit = max_active_downloads
+        step = 0
+        if cpu > CPU_BUSY_LIMIT or disk_util > DISK_BUSY_LIMIT:
+            step = -1
+        elif len(downloading_tasks) < limit:
+            # Slots are not all in use, so the rate says nothing about the limit.
+            pass
+        elif last_step > 0:
+            step = 1 if rate > last_rate * 1.05 else -1
+        elif last_step == 0:
+            idle_ticks += 1
+            if idle_ticks >= 4:
+                step = 1
+        new_limit = max(MIN_ACTIVE_DOWNLOADS, min(ACTIVE_DOWNLOADS_CEILING, limit + step))
+        last_step = new_limit - limit
+        if last_step:
+            idle_ticks = 0
+        # A back-off is a revert; hold there instead of probing again at once.
+        if last_step < 0:
+            last_step = 0
+        last_rate = rate
+        max_active_downloads = new_limit
+        tuner_state.update({
+            "limit": new_limit,
+            "download_rate": rate,
+            "disk_write_rate": disk_write,
+            "disk_util": round(disk_util, 3),
+            "cpu": round(cpu, 3),
+        })
+        if new_limit > limit:
+            wake_scheduler()
+
+async def recheck(infohash, status):
+    layout = engine.layout(infohash)
+    if layout is None:
+        add_log(infohash, "Recheck needs v1 metadata, skipped", level=WARNING)
+        return
+    files, piece_length, hashes = layout
+    engine.pause(infohash)
+    add_log(infohash, "Verifying %d pieces on %d workers", len(hashes), VERIFY_WORKERS)
+    total_size = sum(size for _, size, _ in files)
+
+    def on_progress(done, total):
+        if status.update("Verifying pieces", done * 100 / total, 0, 0, total_size):
+            touch(infohash)
+
+    on_progress(0, max(1, len(hashes)))
+
+    started = asyncio.get_running_loop().time()
+    have = await verify_pieces_async(files, piece_length, hashes, VERIFY_WORKERS, on_progress)
+    elapsed = asyncio.get_running_loop().time() - started
+    add_log(infohash, "Verified %d/%d pieces in %.1fs", sum(have), len(have), elapsed)
+    engine.adopt(infohash, have)
+
+async def handle_download(infohash, magnet):
+    finished = False
+    try:
+        if not engine.available:
+            add_log(infohash, "libtorrent not installed.", level=ERROR)
+            return
+        status = set_active(infohash, magnet)
+        add_log(infohash, "Queued for download")
+        storage_mode = job_storage.get(infohash, STORAGE_MODE)
+        unchecked = engine.add(infohash, magnet, job_limits.get(infohash, (0, 0)), storage_mode)
+        if infohash in paused:
+            engine.pause(infohash)
+        add_log(infohash, "Added to session (%s storage)", storage_mode)
+        allocated = storage_mode != "preallocate"
+        no_peer_start_time = None
+        while not engine.status(infohash).is_finished:
+            st = engine.status(infohash)
+            if st.errc.value():
+                raise RuntimeError(st.errc.message())
+            if unchecked and st.has_metadata:
+                # Files left without resume data are verified here instead
+                # of by libtorrent's single-threaded check.
+                unchecked = False
+                if await asyncio.to_thread(existing_files, engine.file_list(infohash)):
+                    add_log(infohash, "Found files on disk without resume data")
+                    recheck_requests.add(infohash)
+            if not allocated and st.has_metadata:
+                allocated = True
+                if await asyncio.to_thread(preallocate, engine.file_list(infohash)):
+                    add_log(infohash, "Preallocated files with fallocate")
+                else:
+                    add_log(infohash, "fallocate unsupported, relying on libtorrent allocation", level=WARNING)
+            if infohash in recheck_requests and st.has_metadata:
+                recheck_requests.discard(infohash)
+                await recheck(infohash, status)
+                if infohash in paused:
+                    engine.pause(infohash)
+                continue
+            if infohash in paused:
+                # Paused jobs keep their slot and are never stall-cancelled.
+                no_peer_start_time = None
+                if status.update("Paused", status.progress, 0, 0, status.total_size):
+                    touch(infohash)
+                await asyncio.sleep(3)
+                continue
+            peers = st.num_peers
+            progress = st.progress * 100
+            speed_bps = st.download_rate
+            total_size = st.total_wanted
+
+            add_log(infohash, "Peers=%d | Progress=%.2f%% | Speed=%.1fKB/s", peers, progress, speed_bps / 1024,
+                    level=DEBUG)
+
+            if peers == 0:
+                if no_peer_start_time is None:
+                    no_peer_start_time = asyncio.get_running_loop().time()
+                    add_log(infohash, "No peers, timer started")
+                elif asyncio.get_running_loop().time() - no_peer_start_time > 120:
+                    add_log(infohash, "Auto-cancel: no peers for 2m", level=WARNING)
+                    stats["stall_cancellations"] += 1
+                    drop_active(infohash)
+                    return
+            else:
+                no_peer_start_time = None
+
+            # ETA is derived by readers of the status table, for all jobs at once.
+            if status.update("Downloading" if peers > 0 else "Connecting to peers...",
+                             max(0, min(100, progress)), max(0, speed_bps), max(0, peers), total_size):
+                touch(infohash)
+            await engine.wait_finished(infohash, 3)
+        # Complete
+        finished = True
+        add_log(infohash, "Download complete")
+        drop_active(infohash)
+        completed_files[infohash] = []
+        for file in engine.files(infohash):
+            path = os.path.join(DOWNLOAD_DIR, file)
+            if os.path.exists(path):
+                completed_files[infohash].append({
+                    "file": file,
+                    "download_url": f"/file/{file}"
+                })
+                add_log(infohash, "File ready: %s", file)
+        store.put("completed", infohash, completed_files[infohash])
+        touch(infohash)
+    except Exception as e:
+        add_log(infohash, "%s", str(e), level=ERROR)
+        drop_active(infohash)
+    finally:
+        # Cancelled, stalled and failed jobs keep resume data for a restart.
+        engine.remove(infohash, keep_resume=not finished)
+        # After a delete and an immediate re-add, the job state under this
+        # infohash belongs to the new job, queued or already running.
+        task = asyncio.current_task()
+        if infohash not in download_queue and downloading_tasks.get(infohash, task) is task:
+            recheck_requests.discard(infohash)
+            paused.discard(infohash)
+            downloading_tasks.pop(infohash, None)
+            magnets.pop(infohash, None)
+            if job_limits.pop(infohash, None) is not None:
+                store.delete("limits", infohash)
+            set_job_storage(infohash, STORAGE_MODE)
+        wake_scheduler()
+
+def load_state():
+    completed_files.update(store.load("completed"))
+    for key, limits in store.load("limits").items():
+        if key == "global":
+            engine.set_global_limits(*limits)
+        else:
+            job_limits[key] = tuple(limits)
+    job_storage.update(store.load("storage"))
+    for infohash, records in store.load_logs().items():
+        job_logs.restore(infohash, records)
+    for infohash, row in store.load("queue").items():
+        download_queue.push(infohash, row["magnet"], row.get("priority", 0), row.get("enqueued_at", 0))
+        magnets[infohash] = row["magnet"]
+    # Jobs that were running when the process stopped go back to the front.
+    for infohash, info in store.load("active").items():
+        store.delete("active", infohash)
+        if info.get("magnet"):
+            enqueue(infohash, info["magnet"], enqueued_at=0)
+    store.flush()
+
+async def store_flusher():
+    while True:
+        await asyncio.sleep(STORE_FLUSH_INTERVAL)
+        await asyncio.to_thread(store.write, store.take())
+
+
+# Commands: every state change requested through the API. They take and
+# return plain JSON values so they can be run locally or on behalf of
+# another worker.
+
+def cmd_add(data):
+    magnet = data.get("magnet", "").strip()
+    infohash = parse_infohash(magnet)
+    priority = int(data.get("priority", 0))
+    limits = parse_limits(data)
+    storage_mode = data.get("storage", STORAGE_MODE)
+    if storage_mode not in STORAGE_MODES:
+        return {"added": False, "infohash": infohash, "error": f"storage must be one of {list(STORAGE_MODES)}"}
+    if infohash and not is_known(infohash):
+        set_job_limits(infohash, limits)
+        set_job_storage(infohash, storage_mode)
+        enqueue(infohash, magnet, priority)
+        return {"added": True, "infohash": infohash}
+    return {"added": False, "infohash": infohash}
+
+def cmd_stage_batch(batch, items):
+    # Parts of a batch too big for one command line, held until add_batch
+    # commits them with the last part. Abandoned ones expire.
+    now = time.monotonic()
+    for key in [key for key, (at, _) in staged_batches.items() if now - at > BATCH_STAGE_TIMEOUT]:
+        del staged_batches[key]
+    staged = staged_batches.setdefault(batch, (now, []))[1]
+    staged.extend(items if isinstance(items, list) else [])
+    staged_batches[batch] = (now, staged)
+    return {"staged": len(staged)}
+
+def cmd_add_batch(items, priority=0, batch=None):
+    # Validate and dedupe everything first, then enqueue in one go so the
+    # batch lands atomically.
+    if batch is not None:
+        items = staged_batches.pop(batch, (0, []))[1] + (items if isinstance(items, list) else [])
+    results = []
+    accepted = {}
+    for item in items if isinstance(items, list) else []:
+        magnet, item_priority = item, priority
+        if isinstance(item, dict):
+            magnet = item.get("magnet")
+            item_priority = item.get("priority", priority)
+        infohash = parse_infohash(magnet.strip()) if isinstance(magnet, str) else None
+        if not infohash or not isinstance(item_priority, int):
+            status = "rejected"
+        elif infohash in accepted or is_known(infohash):
+            status = "duplicate"
+        else:
+            status = "added"
+            accepted[infohash] = (magnet.strip(), item_priority)
+        results.append({"infohash": infohash, "status": status})
+    for infohash, (magnet, item_priority) in accepted.items():
+        enqueue(infohash, magnet, item_priority)
+    added = len(accepted)
+    rejected = sum(1 for r in results if r["status"] == "rejected")
+    return {"added": added, "duplicate": len(results) - added - rejected, "rejected": rejected, "results": results}
+
+def cmd_delete(data):
+    infohash = resolve_job(data.get("magnet"))
+    if infohash in downloading_tasks:
+        downloading_tasks[infohash].cancel()
+        drop_active(infohash)
+        downloading_tasks.pop(infohash, None)
+        # A pause or recheck belongs to the cancelled job, not a re-added one.
+        paused.discard(infohash)
+        recheck_requests.discard(infohash)
+        add_log(infohash, "Cancelled by user")
+        wake_scheduler()
+        return {"deleted": True}
+    if infohash in download_queue:
+        download_queue.remove(infohash)
+        magnets.pop(infohash, None)
+        store.delete("queue", infohash)
+        queue_changed()
+        set_job_limits(infohash, (0, 0))
+        set_job_storage(infohash, STORAGE_MODE)
+        return {"deleted": True}
+    if infohash in completed_files:
+        # Out of the catalog so it can be added again; files stay on disk.
+        del completed_files[infohash]
+        store.delete("completed", infohash)
+        touch(infohash)
+        return {"deleted": True}
+    return {"deleted": False}
+
+def cmd_limits(data):
+    # Bytes/s, 0 = unlimited. With a magnet/infohash the caps apply to that
+    # job (queued or active), otherwise to the whole session.
+    if not data.get("magnet"):
+        limits = parse_limits(data, engine.global_limits)
+        engine.set_global_limits(*limits)
+        store.put("limits", "global", list(limits))
+        return {"updated": True, "download_limit": limits[0], "upload_limit": limits[1]}
+    infohash = resolve_job(data.get("magnet"))
+    if infohash in download_queue or infohash in downloading_tasks:
+        limits = parse_limits(data, job_limits.get(infohash, (0, 0)))
+        set_job_limits(infohash, limits)
+        return {"updated": True, "download_limit": limits[0], "upload_limit": limits[1]}
+    return {"updated": False}
+
+def cmd_recheck(data):
+    # Runs on the job's next status tick once metadata is known.
+    infohash = resolve_job(data.get("magnet"))
+    if infohash in downloading_tasks:
+        recheck_requests.add(infohash)
+        add_log(infohash, "Recheck requested")
+        return {"recheck": True}
+    return {"recheck": False}
+
+def cmd_pause(data):
+    infohash = resolve_job(data.get("magnet"))
+    if infohash in downloading_tasks and infohash in engine.handles and infohash not in paused:
+        paused.add(infohash)
+        engine.pause(infohash)
+        add_log(infohash, "Paused by user")
+        return {"paused": True}
+    return {"paused": False}
+
+def cmd_resume(data):
+    infohash = resolve_job(data.get("magnet"))
+    if infohash in paused:
+        paused.discard(infohash)
+        engine.resume(infohash)
+        add_log(infohash, "Resumed by user")
+        return {"resumed": True}
+    return {"resumed": False}
+
+def cmd_priority(data):
+    infohash = resolve_job(data.get("magnet"))
+    priority = int(data["priority"])
+    if infohash in download_queue:
+        download_queue.reprioritize(infohash, priority)
+        store.put("queue", infohash, download_queue.get(infohash))
+        queue_changed()
+        wake_scheduler()
+        return {"updated": True}
+    return {"updated": False}
+
+def cmd_stream_open(infohash, path):
+    # "completed" (serve from disk), "missing", "pending" (no metadata yet)
+    # or "ready" with the file's span in the torrent.
+    for entry in completed_files.get(infohash, []):
+        if entry["file"] == path:
+            return {"state": "completed"}
+    if infohash not in engine.handles:
+        return {"state": "missing"}
+    status = engine.status(infohash)
+    if status is not None and not status.has_metadata:
+        return {"state": "pending"}
+    span = engine.file_span(infohash, path)
+    if not span:
+        return {"state": "missing"}
+    return {"state": "ready", "span": list(span)}
+
+async def cmd_stream_pieces(infohash, first, last, deadline_ms, wait):
+    # Puts deadlines on first..last and waits up to `wait` seconds for
+    # `first` to be on disk.
+    if infohash not in engine.handles:
+        return {"state": "missing"}
+    engine.set_deadlines(infohash, first, last, deadline_ms)
+    try:
+        await engine.wait_piece(infohash, first, wait)
+    except asyncio.TimeoutError:
+        return {"state": "timeout"}
+    except KeyError:
+        return {"state": "missing"}
+    return {"state": "ready"}
+
+def cmd_stream_close(infohash):
+    engine.clear_deadlines(infohash)
+    return {}
+
+COMMANDS = {
+    "add": cmd_add,
+    "stage_batch": cmd_stage_batch,
+    "add_batch": cmd_add_batch,
+    "delete": cmd_delete,
+    "limits": cmd_limits,
+    "recheck": cmd_recheck,
+    "pause": cmd_pause,
+    "resume": cmd_resume,
+    "priority": cmd_priority,
+    "stream_open": cmd_stream_open,
+    "stream_pieces": cmd_stream_pieces,
+    "stream_close": cmd_stream_close,
+}
+
+async def run_command(name, args):
+    try:
+        result = COMMANDS[name](**args)
+        if asyncio.iscoroutine(result):
+            result = await result
+        return {"ok": result}
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+command_connections = set()
+
+async def serve_commands(reader, writer):
+    # One connection per API worker; newline-delimited JSON requests
+    # {"id", "name", "args"} answered by id, possibly out of order.
+    async def answer(request):
+        reply = await run_command(request["name"], request["args"])
+        writer.write(json.dumps({"id": request["id"], **reply}).encode() + b"\n")
+
+    tasks = set()
+    command_connections.add(writer)
+    oversized = False
+    try:
+        while True:
+            try:
+                line = await reader.readuntil(b"\n")
+            except asyncio.LimitOverrunError as e:
+                # Skipped, not fatal: the connection is shared by all of a
+                # worker's requests. Clients refuse to send such lines.
+                await reader.readexactly(e.consumed)
+                oversized = True
+                continue
+            if oversized:
+                oversized = False
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError:
+                continue
+            task = asyncio.create_task(answer(request))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        command_connections.discard(writer)
+        writer.close()
+
+# Views, published for the API workers.
+
+def view_queue(limit=50):
+    return {"queued": len(download_queue),
+            "next": [{"infohash": infohash, **info} for infohash, info in download_queue.head(limit)]}
+
+def view_limits():
+    download, upload = engine.global_limits
+    return {"download_limit": download, "upload_limit": upload,
+            "torrents": {infohash: {"download_limit": d, "upload_limit": u} for infohash, (d, u) in job_limits.items()}}
+
+def view_concurrency():
+    return {"max_active_downloads": max_active_downloads, **tuner_state}
+
+def view_loop(limit=20):
+    return loop_monitor.view(limit)
+
+def view_metrics():
+    out = []
+    metrics.sample(out, "torrent_queue_depth", "gauge", "Jobs waiting in the queue.", len(download_queue))
+    metrics.sample(out, "torrent_active", "gauge", "Jobs currently downloading.", len(downloading_tasks))
+    metrics.sample(out, "torrent_completed", "gauge", "Completed jobs in the catalog.", len(completed_files))
+    metrics.sample(out, "torrent_max_active", "gauge", "Current concurrency limit.", max_active_downloads)
+    metrics.sample(out, "torrent_stall_cancellations_total", "counter",
+                   "Jobs cancelled after having no peers for too long.", stats["stall_cancellations"])
+    queue_wait.render(out, "torrent_queue_wait_seconds", "Time from enqueue to download start.")
+    loop_monitor.lag.render(out, "torrent_loop_lag_seconds", "Event loop wake-up lag.")
+    loop_monitor.blocked.render(out, "torrent_loop_blocked_seconds", "Duration of callbacks that blocked the loop.")
+    metrics.sample(out, "torrent_slow_callbacks_total", "counter",
+                   "Callbacks that blocked the event loop past the threshold.", loop_monitor.slow_total)
+
+    # Per-torrent series in one pass over the cached engine statuses.
+    per_torrent = {"downloaded": [], "uploaded": [], "peers": []}
+    total_down = total_up = down_rate = up_rate = peers = 0
+    for infohash, st in engine.statuses.items():
+        label = f'{{infohash="{infohash}"}}'
+        per_torrent["downloaded"].append(f"torrent_downloaded_bytes_total{label} {st.all_time_download}")
+        per_torrent["uploaded"].append(f"torrent_uploaded_bytes_total{label} {st.all_time_upload}")
+        per_torrent["peers"].append(f"torrent_peers{label} {st.num_peers}")
+        total_down += st.all_time_download
+        total_up += st.all_time_upload
+        down_rate += st.download_rate
+        up_rate += st.upload_rate
+        peers += st.num_peers
+    metrics.header(out, "torrent_downloaded_bytes_total", "counter", "Payload bytes downloaded per torrent.")
+    out.extend(per_torrent["downloaded"])
+    metrics.header(out, "torrent_uploaded_bytes_total", "counter", "Payload bytes uploaded per torrent.")
+    out.extend(per_torrent["uploaded"])
+    metrics.header(out, "torrent_peers", "gauge", "Connected peers per torrent.")
+    out.extend(per_torrent["peers"])
+    metrics.sample(out, "torrent_session_downloaded_bytes", "gauge", "Bytes downloaded by active torrents.", total_down)
+    metrics.sample(out, "torrent_session_uploaded_bytes", "gauge", "Bytes uploaded by active torrents.", total_up)
+    metrics.sample(out, "torrent_download_rate_bytes", "gauge", "Aggregate download rate in bytes/s.", down_rate)
+    metrics.sample(out, "torrent_upload_rate_bytes", "gauge", "Aggregate upload rate in bytes/s.", up_rate)
+    metrics.sample(out, "torrent_session_peers", "gauge", "Connected peers across active torrents.", peers)
+    return "\n".join(out) + "\n"
+
+PUBLISHED_QUEUE_LENGTH = 200
+
+def publish():
+    # Active statuses are already in the status table; the completed catalog
+    # and the views go to the state store.
+    # Named after the first file, for sorting the catalog by name. The time
+    # only counts for jobs published for the first time, i.e. just finished.
+    now = time.time()
+    rows = [(infohash, version, (completed_files[infohash] or [{"file": infohash}])[0]["file"], now,
+             {"completed": completed_files[infohash]})
+            for infohash, version in unpublished.items() if infohash in completed_files]
+    # Deleted from the catalog (or never in it, which costs nothing).
+    deleted = [(infohash, version) for infohash, version in unpublished.items() if infohash not in completed_files]
+    unpublished.clear()
+    docs = {
+        "queue": view_queue(PUBLISHED_QUEUE_LENGTH),
+        "limits": view_limits(),
+        "concurrency": view_concurrency(),
+        "loop": view_loop(),
+        "metrics": view_metrics(),
+    }
+    return store.encode_published(rows, docs, deleted)
+
+async def publisher():
+    while True:
+        await asyncio.sleep(PROGRESS_TICK)
+        version = state_version
+        await asyncio.to_thread(store.publish, *publish())
+        # Only now is everything up to `version` readable by the API workers.
+        status_table.publish(version)
+
+def start():
+    global status_table
+    status_table = StatusWriter(STATUS_TABLE, STATUS_SLOTS, state_version)
+    asyncio.create_task(loop_monitor.run())
+    load_state()
+    # Everything restored from the store counts as changed for the API.
+    unpublished.update(dict.fromkeys(completed_files, state_version))
+    engine.start()
+    asyncio.create_task(engine.run(ENGINE_TICK))
+    asyncio.create_task(store_flusher())
+    asyncio.create_task(download_worker())
+    asyncio.create_task(concurrency_tuner())
+    asyncio.create_task(publisher())
+    wake_scheduler()
+
+def stop():
+    engine.stop()
+    store.close()
+    status_table.close()
+
+async def serve():
+    start()
+    server = await asyncio.start_unix_server(serve_commands, ENGINE_SOCKET, limit=COMMAND_LINE_LIMIT)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+    await stopping.wait()
+    server.close()
+    # EOF lets the connection handlers return before the loop goes away.
+    for writer in list(command_connections):
+        writer.transport.abort()
+    await asyncio.sleep(0)
+    stop()
+
+def main():
+    # Exits right away if another engine process holds the lock.
+    if claim_engine(ENGINE_LOCK) is None:
+        return
+    if os.path.exists(ENGINE_SOCKET):
+        os.unlink(ENGINE_SOCKET)
+    asyncio.run(serve())
+
+if __name__ == "__main__":
+    main()
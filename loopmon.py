@@ -0,0 +1,81 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from metrics import Histogram
+
+LAG_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+
+class LoopMonitor:
+    # Measures event-loop lag from how late a periodic sleep wakes up, and
+    # runs a watchdog thread that snapshots the loop thread's stack whenever
+    # the loop stops ticking for longer than `threshold` seconds.
+    def __init__(self, interval=0.25, threshold=0.1, keep=50):
+        self.interval = interval
+        self.threshold = threshold
+        self.lag = Histogram(LAG_BUCKETS)
+        self.blocked = Histogram(LAG_BUCKETS)
+        self.slow = deque(maxlen=keep)
+        self.slow_total = 0
+        self.heartbeat = time.monotonic()
+        self.loop_thread = None
+
+    async def run(self):
+        self.loop_thread = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        threading.Thread(target=self.watch, name="loop-watchdog", daemon=True).start()
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lag.observe(max(0.0, loop.time() - start - self.interval))
+            self.heartbeat = time.monotonic()
+
+    def view(self, limit=20):
+        return {
+            "threshold": self.threshold,
+            "lag": self.lag.as_dict(),
+            "blocked": self.blocked.as_dict(),
+            "slow_callbacks_total": self.slow_total,
+            "slow_callbacks": list(self.slow)[-limit:][::-1],
+        }
+
+    def watch(self):
+        current = None
+        current_beat = None
+        while True:
+            time.sleep(self.threshold / 2)
+            beat = self.heartbeat
+            stalled = time.monotonic() - beat - self.interval
+            if current is not None and beat != current_beat:
+                self.blocked.observe(current["duration"])
+                current = None
+            if stalled <= self.threshold:
+                continue
+            if current is None:
+                current = self.capture(stalled)
+                current_beat = beat
+                self.slow.append(current)
+                self.slow_total += 1
+            else:
+                current["duration"] = round(stalled, 4)
+
+    def capture(self, stalled):
+        frame = sys._current_frames().get(self.loop_thread)
+        infohash = None
+        walk = frame
+        while walk is not None and infohash is None:
+            value = walk.f_locals.get("infohash")
+            if isinstance(value, str):
+                infohash = value
+            walk = walk.f_back
+        return {
+            "at": time.time(),
+            "duration": round(stalled, 4),
+            "infohash": infohash,
+            "stack": traceback.format_stack(frame) if frame is not None else [],
+        }
@@ -0,0 +1,50 @@
+# Minimal Prometheus text exposition (format 0.0.4) helpers.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def as_dict(self):
+        return {"buckets": dict(zip(map(str, self.buckets), self.counts)), "sum": self.sum, "count": self.count}
+
+    def render(self, out, name, help_text):
+        header(out, name, "histogram", help_text)
+        histogram(out, name, self.as_dict())
+
+
+def histogram(out, name, data, labels=""):
+    # Sample lines for a Histogram.as_dict(), e.g. one reported by another
+    # process; `labels` like 'pid="42"'.
+    prefix = labels + "," if labels else ""
+    suffix = "{" + labels + "}" if labels else ""
+    cumulative = 0
+    for bound, count in data["buckets"].items():
+        cumulative += count
+        out.append(f'{name}_bucket{{{prefix}le="{float(bound):g}"}} {cumulative}')
+    out.append(f'{name}_bucket{{{prefix}le="+Inf"}} {data["count"]}')
+    out.append(f"{name}_sum{suffix} {data['sum']}")
+    out.append(f"{name}_count{suffix} {data['count']}")
+
+
+def header(out, name, kind, help_text):
+    out.append(f"# HELP {name} {help_text}")
+    out.append(f"# TYPE {name} {kind}")
+
+
+def sample(out, name, kind, help_text, value):
+    header(out, name, kind, help_text)
+    out.append(f"{name} {value}")
@@ -0,0 +1,90 @@
+import asyncio
+import gzip
+import json
+from collections import OrderedDict
+
+from assets import negotiate
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# JSON bodies serialized once and compressed at most once per encoding, so a
+# snapshot shared by many clients costs one encode however often it is sent.
+
+MIN_COMPRESS_SIZE = 1024
+# Server preference when the client accepts several.
+ENCODINGS = tuple(name for name, module in (("zstd", zstandard), ("br", brotli), ("gzip", gzip)) if module)
+# Compressed in a worker thread above this size, to keep the loop free.
+THREAD_COMPRESS_SIZE = 64 * 1024
+
+
+def dumps(value):
+    if orjson:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def compress(data, encoding):
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if encoding == "br":
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, 6, mtime=0)
+
+
+class Payload:
+    def __init__(self, data):
+        self.variants = {None: data}
+
+    async def encoded(self, encoding):
+        if encoding not in self.variants:
+            data = self.variants[None]
+            if len(data) > THREAD_COMPRESS_SIZE:
+                self.variants[encoding] = await asyncio.to_thread(compress, data, encoding)
+            else:
+                self.variants[encoding] = compress(data, encoding)
+        return self.variants[encoding]
+
+    async def render(self, accept_encoding):
+        # (body, headers) for a client sending `accept_encoding`.
+        headers = {"vary": "accept-encoding"}
+        encoding = None
+        if len(self.variants[None]) >= MIN_COMPRESS_SIZE:
+            encoding = negotiate(accept_encoding, ENCODINGS)
+        if encoding:
+            headers["content-encoding"] = encoding
+        return await self.encoded(encoding), headers
+
+
+def json_payload(value):
+    return Payload(dumps(value))
+
+
+class PayloadCache:
+    # Small LRU of payloads by key (e.g. state version and cursor).
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        payload = self.entries.get(key)
+        if payload is not None:
+            self.entries.move_to_end(key)
+        return payload
+
+    def put(self, key, payload):
+        self.entries[key] = payload
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return payload
@@ -0,0 +1,142 @@
+const openLogs = {};
+// The completed catalog is paged in separately and reloaded when it grows.
+const completed = {html: '', next: null, total: null};
+
+function escapeHtml(text) {
+  return String(text).replace(/[&<>"']/g, c => `&#${c.charCodeAt(0)};`);
+}
+
+function postJson(url, body) {
+  return fetch(url, {method: "POST", headers: {"Content-Type": "application/json"}, body: JSON.stringify(body)});
+}
+
+function showLogs(mag) {
+  fetch(`/logs/${mag}?limit=10&tail=true`).then(r => r.json()).then(data => {
+    const box = document.getElementById(`logs-${mag}`);
+    if (!box) return;
+    const lines = data.records.map(r =>
+      `[${new Date(r.time * 1000).toLocaleTimeString()}] ${r.level.toUpperCase()} ${escapeHtml(r.message)}`);
+    box.classList.remove("hidden");
+    box.innerHTML = lines.join("<br>");
+  });
+}
+
+function formatEta(seconds) {
+  if (seconds === null || seconds === undefined) return "Calculating...";
+  const m = Math.floor(seconds / 60), s = seconds % 60;
+  return `${String(m).padStart(2, '0')}:${String(s).padStart(2, '0')}`;
+}
+
+function render(data) {
+  let activeHTML = '';
+  let activeCount = 0;
+  for (const mag in data.active) {
+    activeCount++;
+    const info = data.active[mag];
+    const prog = info.progress || 0;
+    const progress = `${prog.toFixed(2)}%`;
+    const eta = formatEta(info.eta);
+    const fileSize = info.total_size > 0 ? `${(info.total_size / (1024*1024)).toFixed(2)} MB` : "Unknown";
+    const speed = `${((info.download_rate || 0) / 1024).toFixed(1)} KB/s`;
+    const status = info.status || "Unknown";
+    const paused = status === "Paused";
+    activeHTML += `
+      <div class="torrent card">
+        <div><strong>Status:</strong> ${escapeHtml(status)}</div>
+        <div class="magnet-text text-muted">${escapeHtml(info.magnet || mag)}</div>
+        <div><strong>Progress:</strong> ${progress}
+        &nbsp;|&nbsp;<strong>ETA:</strong> ${eta}
+        &nbsp;|&nbsp;<strong>Size:</strong> ${fileSize}
+        &nbsp;|&nbsp;<strong>Peers:</strong> ${info.peers}
+        &nbsp;|&nbsp;<strong>Speed:</strong> ${speed}</div>
+        <div class="progress"><div class="progress-bar" style="width:${prog}%">${progress}</div></div>
+        <div class="log-box hidden" id="logs-${mag}"></div>
+        <button class="btn btn-secondary btn-sm" data-action="logs" data-mag="${mag}">Logs</button>
+        <button class="btn btn-warning btn-sm" data-action="${paused ? "resume" : "pause"}"
+                data-mag="${mag}">${paused ? "Resume" : "Pause"}</button>
+        <button class="btn btn-danger btn-sm" data-action="delete" data-mag="${mag}">Cancel</button>
+      </div>`;
+  }
+  document.getElementById("active").innerHTML = activeHTML || "<p class='text-muted'>No active downloads</p>";
+  document.getElementById("activeCount").textContent = activeCount;
+  const s = data.summary;
+  if (s && s.progress) {
+    document.getElementById("activeCount").textContent = s.active;
+    document.getElementById("summary").textContent =
+      `${(s.download_rate / 1024).toFixed(1)} KB/s total | ${s.peers} peers`
+      + ` | median progress ${s.progress.p50.toFixed(2)}% | all done in ${formatEta(s.eta)}`;
+  }
+  if (s && s.completed !== completed.total) {
+    completed.total = s.completed;
+    loadCompleted(true);
+  }
+
+  for (const mag in openLogs) { showLogs(mag); }
+}
+
+function loadCompleted(reset) {
+  if (reset) { completed.html = ''; completed.next = null; }
+  const cursor = completed.next ? `&cursor=${encodeURIComponent(completed.next)}` : '';
+  fetch(`/progress?status=completed&limit=50${cursor}`).then(r => r.json()).then(page => {
+    for (const mag in page.completed) {
+      page.completed[mag].forEach(f => {
+        const fileName = escapeHtml(f.file || "Unknown file");
+        const downloadUrl = escapeHtml(f.download_url || "#");
+        completed.html += `<div class="file"><a class="btn btn-outline-success btn-sm" href="${downloadUrl}" target="_blank">${fileName}</a></div>`;
+      });
+    }
+    completed.next = page.next;
+    document.getElementById("completed").innerHTML =
+      completed.html || "<p class='text-muted'>No completed downloads</p>";
+    document.getElementById("completedCount").textContent = page.total;
+    document.getElementById("moreCompleted").classList.toggle("hidden", !page.next);
+  });
+}
+
+function refreshDashboard() {
+  Promise.all([
+    fetch("/progress?status=active&limit=1000").then(r => r.json()),
+    fetch("/progress/summary").then(r => r.json()),
+  ]).then(([page, summary]) => render({active: page.active, summary: summary}));
+}
+
+document.getElementById("moreCompleted").addEventListener("click", () => loadCompleted(false));
+
+document.getElementById("active").addEventListener("click", e => {
+  const button = e.target.closest("button[data-action]");
+  if (!button) return;
+  const mag = button.dataset.mag;
+  const action = button.dataset.action;
+  if (action === "logs") {
+    if (openLogs[mag]) { delete openLogs[mag]; document.getElementById(`logs-${mag}`).classList.add("hidden"); }
+    else { openLogs[mag] = true; showLogs(mag); }
+    return;
+  }
+  button.disabled = true;
+  if (action === "delete") button.textContent = "Cancelling...";
+  postJson(`/${action}`, {magnet: mag}).then(refreshDashboard);
+});
+
+document.getElementById("addForm").addEventListener("submit", e => {
+  e.preventDefault();
+  const input = document.getElementById("magnet");
+  const submit = e.target.querySelector("button[type=submit]");
+  const mag = input.value.trim();
+  if (!mag) return;
+  submit.disabled = true;
+  submit.textContent = "Adding...";
+  postJson("/add", {magnet: mag}).then(() => {
+    input.value = '';
+    submit.disabled = false;
+    submit.textContent = "Add Torrent";
+    refreshDashboard();
+  });
+});
+
+if (window.EventSource) {
+  const source = new EventSource("/progress/stream");
+  source.onmessage = e => render(JSON.parse(e.data));
+} else {
+  setInterval(refreshDashboard, 4000);
+  refreshDashboard();
+}
@@ -0,0 +1,353 @@
+import mmap
+import os
+import struct
+
+import numpy as np
+
+# Columnar table of per-torrent status in a shared file mapping (tmpfs by
+# default). One writer, the engine process; any number of readers. Each
+# column is a contiguous array over all slots, so readers get ETA, totals,
+# percentiles and sort orders for the whole fleet from a few vectorized
+# passes. Every row sits behind a seqlock: the writer makes its sequence
+# odd, writes, then makes it even again; readers copy the columns and re-read
+# only the rows whose sequence moved meanwhile. Nobody takes a lock.
+
+SEQ = struct.Struct("<Q")
+# Bounded, so a writer that died mid-update cannot hang its readers.
+READ_RETRIES = 1000
+HEADER = struct.Struct("<QQQQ")  # slots, used (high-water mark), version, horizon
+HEADER_SIZE = 64
+COLUMNS = (
+    ("seq", "<u8"),
+    ("version", "<u8"),
+    ("state", "u1"),
+    ("status", "u1"),
+    ("infohash", "S68"),  # v1 hex is 40, a v2 multihash 68
+    ("progress", "<f8"),
+    ("download_rate", "<i8"),
+    ("peers", "<i8"),
+    ("total_size", "<i8"),
+    ("download_limit", "<i8"),
+    ("upload_limit", "<i8"),
+    ("magnet", "S2048"),
+)
+MAGNET_SIZE = 2048
+FREE, ACTIVE, REMOVED = 0, 1, 2
+STATUS_NAMES = ("Connecting to peers...", "Downloading", "Verifying pieces", "Paused")
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+# Short names for filtering, by status code.
+STATUS_KEYS = ("connecting", "downloading", "verifying", "paused")
+SORT_KEYS = ("progress", "download_rate", "eta", "total_size", "peers")
+# Everything but the magnet, which is only read for the rows being returned.
+SNAPSHOT_COLUMNS = tuple(name for name, _ in COLUMNS if name not in ("seq", "magnet"))
+
+
+def column_bytes(slots, dtype):
+    # Rounded up to a cache line.
+    return -(-slots * np.dtype(dtype).itemsize // 64) * 64
+
+
+def table_size(slots):
+    return HEADER_SIZE + sum(column_bytes(slots, dtype) for _, dtype in COLUMNS)
+
+
+def map_columns(buf, slots):
+    columns = {}
+    offset = HEADER_SIZE
+    for name, dtype in COLUMNS:
+        columns[name] = np.ndarray(slots, dtype, buffer=buf, offset=offset)
+        offset += column_bytes(slots, dtype)
+    return columns
+
+
+def read_header(buf):
+    # None if no stable header could be read.
+    for attempt in range(READ_RETRIES):
+        if attempt:
+            os.sched_yield()
+        seq = SEQ.unpack_from(buf, 0)[0]
+        if seq & 1:
+            continue
+        values = HEADER.unpack_from(buf, SEQ.size)
+        if SEQ.unpack_from(buf, 0)[0] == seq:
+            return values
+    return None
+
+
+def magnet_bytes(magnet):
+    # Longer magnets are left out rather than published cut short; readers
+    # get "" and fall back to the infohash.
+    data = magnet.encode()
+    return data if len(data) <= MAGNET_SIZE else b""
+
+
+class StatusWriter:
+    # Slots of removed torrents are kept as tombstones (so readers can report
+    # them in deltas) until reused, oldest first. Reusing one moves the
+    # horizon: cursors older than it can no longer be answered with a delta.
+    def __init__(self, path, slots, version):
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < table_size(slots):
+                os.ftruncate(fd, table_size(slots))
+            self.buf = mmap.mmap(fd, table_size(slots))
+        finally:
+            os.close(fd)
+        self.slots = slots
+        self.columns = map_columns(self.buf, slots)
+        self.index = {}
+        self.tombstones = {}
+        self.free = list(range(slots - 1, -1, -1))
+        self.used = 0
+        self.horizon = version
+        # Rows left by a previous engine process are hidden by used=0 until
+        # they are cleared. It may have died mid-update, leaving a sequence
+        # odd, so all of them start again from zero.
+        SEQ.pack_into(self.buf, 0, 0)
+        self.publish(version)
+        self.columns["seq"][:] = 0
+        self.columns["state"][:] = FREE
+
+    def slot_for(self, infohash):
+        if infohash in self.index:
+            return self.index[infohash]
+        if infohash in self.tombstones:
+            return self.tombstones.pop(infohash)[0]
+        if self.free:
+            slot = self.free.pop()
+            self.used = max(self.used, slot + 1)
+            return slot
+        if not self.tombstones:
+            raise RuntimeError(f"status table full ({self.slots} slots)")
+        oldest = min(self.tombstones, key=lambda key: self.tombstones[key][1])
+        slot, version = self.tombstones.pop(oldest)
+        self.horizon = max(self.horizon, version)
+        return slot
+
+    def write(self, slot, values):
+        seq = self.columns["seq"]
+        seq[slot] += 1
+        for name, value in values.items():
+            self.columns[name][slot] = value
+        seq[slot] += 1
+
+    def put(self, infohash, status, version):
+        slot = self.index[infohash] = self.slot_for(infohash)
+        self.write(slot, {
+            "version": version, "state": ACTIVE, "status": STATUS_CODES[status.status],
+            "infohash": infohash.encode(), "progress": status.progress, "download_rate": status.download_rate,
+            "peers": status.peers, "total_size": status.total_size, "download_limit": status.download_limit,
+            "upload_limit": status.upload_limit, "magnet": magnet_bytes(status.magnet),
+        })
+
+    def remove(self, infohash, version):
+        slot = self.index.pop(infohash, None)
+        if slot is None:
+            return
+        self.tombstones[infohash] = (slot, version)
+        self.write(slot, {"version": version, "state": REMOVED})
+
+    def publish(self, version):
+        # Readers use the header version as their cursor; the engine only
+        # advances it once everything up to `version` is readable.
+        seq = SEQ.unpack_from(self.buf, 0)[0]
+        SEQ.pack_into(self.buf, 0, seq + 1)
+        HEADER.pack_into(self.buf, SEQ.size, self.slots, self.used, version, self.horizon)
+        SEQ.pack_into(self.buf, 0, seq + 2)
+
+    def close(self):
+        self.columns = None
+        self.buf.close()
+
+
+class Snapshot:
+    # Consistent copy of the rows in use, with the derived columns and
+    # orderings computed once for the whole fleet.
+    def __init__(self, version, horizon, rows, live):
+        self.version = version
+        self.horizon = horizon
+        self.live = live
+        active = rows["state"] == ACTIVE
+        self.removed = rows["infohash"][~active], rows["version"][~active]
+        self.rows = rows = {name: column[active] for name, column in rows.items()}
+        progress, rate, total = rows["progress"], rows["download_rate"], rows["total_size"]
+        known = (rate > 100) & (progress > 0) & (progress < 100) & (total > 0)
+        eta = np.full(len(progress), -1, dtype=np.int64)
+        eta[known] = (total[known] * (100 - progress[known]) / 100 / rate[known]).astype(np.int64)
+        rows["eta"] = eta
+        self.orders = {}
+        self.totals = None
+
+    def __len__(self):
+        return len(self.rows["slot"])
+
+    def sort_column(self, key):
+        # Unknown ETAs sort after every known one.
+        column = self.rows[key]
+        if key == "eta":
+            column = np.where(column < 0, np.iinfo(np.int64).max, column)
+        return column
+
+    def order(self, key):
+        # Row indices ascending by (`key`, infohash).
+        if key not in self.orders:
+            self.orders[key] = np.lexsort((self.rows["infohash"], self.sort_column(key)))
+        return self.orders[key]
+
+    def select(self, statuses=None, key="progress", descending=False, after=None, limit=100):
+        # One page of rows matching `statuses` (codes; all if None), ordered
+        # by (key, infohash). `after` is the (value, infohash) of the last row
+        # of the previous page. Returns (records, next `after` or None, total).
+        rows = self.rows
+        match = np.ones(len(self), dtype=bool) if statuses is None else np.isin(rows["status"], statuses)
+        total = int(match.sum())
+        column = self.sort_column(key)
+        if after is not None:
+            value, infohash = after[0], after[1].encode()
+            if descending:
+                match &= (column < value) | ((column == value) & (rows["infohash"] < infohash))
+            else:
+                match &= (column > value) | ((column == value) & (rows["infohash"] > infohash))
+        order = self.order(key)
+        if descending:
+            order = order[::-1]
+        index = order[match[order]]
+        page = index[:limit]
+        following = None
+        if len(index) > limit:
+            last = page[-1]
+            following = (column[last].item(), rows["infohash"][last].decode())
+        return self.records(page), following, total
+
+    def summary(self):
+        if self.totals is None:
+            self.totals = self.aggregate()
+        return self.totals
+
+    def aggregate(self):
+        rows = self.rows
+        progress, rate, total = rows["progress"], rows["download_rate"], rows["total_size"]
+        counts = np.bincount(rows["status"], minlength=len(STATUS_NAMES))
+        eta = rows["eta"][rows["eta"] >= 0]
+        percentiles = (50, 90, 99)
+        if len(self):
+            progress_at = np.percentile(progress, percentiles).round(2).tolist()
+            rate_at = np.percentile(rate, percentiles).astype(np.int64).tolist()
+        else:
+            progress_at, rate_at = [0.0] * 3, [0] * 3
+        return {
+            "active": len(self),
+            "by_status": {name: int(counts[code]) for code, name in enumerate(STATUS_NAMES)},
+            "total_size": int(total.sum()),
+            "downloaded": int((total * progress / 100).sum()),
+            "download_rate": int(rate.sum()),
+            "peers": int(rows["peers"].sum()),
+            "eta": int(eta.max()) if len(eta) else None,
+            "progress": {f"p{p}": value for p, value in zip(percentiles, progress_at)},
+            "download_rate_percentiles": {f"p{p}": value for p, value in zip(percentiles, rate_at)},
+        }
+
+    def records(self, index=None, since=None):
+        # infohash -> status dict for the given rows (all by default), in that
+        # order. With `since`, only rows changed after that version.
+        rows = self.rows
+        if index is None:
+            index = np.arange(len(self))
+        if since is not None:
+            index = index[rows["version"][index] > since]
+        slots = rows["slot"][index]
+        # Magnets come straight from the live table; a slot reused since the
+        # snapshot shows a different infohash there and gets none.
+        magnets = self.live["magnet"][slots].tolist()
+        current = self.live["infohash"][slots].tolist()
+        columns = {name: rows[name][index].tolist()
+                   for name in ("infohash", "status", "progress", "download_rate", "peers", "eta", "total_size",
+                                "download_limit", "upload_limit")}
+        out = {}
+        for i, infohash in enumerate(columns["infohash"]):
+            eta = columns["eta"][i]
+            out[infohash.decode()] = {
+                "magnet": magnets[i].decode(errors="replace") if current[i] == infohash else "",
+                "status": STATUS_NAMES[columns["status"][i]],
+                "progress": columns["progress"][i],
+                "download_rate": columns["download_rate"][i],
+                "peers": columns["peers"][i],
+                "eta": eta if eta >= 0 else None,
+                "total_size": columns["total_size"][i],
+                "download_limit": columns["download_limit"][i],
+                "upload_limit": columns["upload_limit"][i],
+            }
+        return out
+
+    def removed_since(self, since):
+        infohashes, versions = self.removed
+        return [infohash.decode() for infohash in infohashes[versions > since].tolist()]
+
+
+class StatusReader:
+    def __init__(self, path):
+        self.path = path
+        self.buf = None
+        self.columns = None
+        self.cached = None
+
+    def attach(self):
+        if self.buf is None:
+            try:
+                with open(self.path, "rb") as f:
+                    buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                return False
+            header = read_header(buf)
+            slots = header[0] if header else 0
+            if not slots or len(buf) < table_size(slots):
+                buf.close()
+                return False
+            self.buf = buf
+            self.columns = map_columns(buf, slots)
+        return True
+
+    def header(self):
+        # (version, horizon), or None while the engine has not started yet.
+        if not self.attach():
+            return None
+        header = read_header(self.buf)
+        if header is None:
+            return None
+        _, _, version, horizon = header
+        return version, horizon
+
+    def snapshot(self):
+        # One copy and one vectorized pass per published version; requests in
+        # between share it.
+        if not self.attach():
+            return None
+        header = read_header(self.buf)
+        if header is None:
+            return self.cached
+        _, used, version, horizon = header
+        if self.cached is not None and self.cached.version == version:
+            return self.cached
+        columns = self.columns
+        seq = columns["seq"][:used].copy()
+        rows = {name: columns[name][:used].copy() for name in SNAPSHOT_COLUMNS}
+        torn = (seq & 1).astype(bool) | (columns["seq"][:used] != seq)
+        for slot in np.flatnonzero(torn).tolist():
+            for attempt in range(READ_RETRIES):
+                if attempt:
+                    os.sched_yield()
+                before = int(columns["seq"][slot])
+                if before & 1:
+                    continue
+                values = {name: columns[name][slot] for name in SNAPSHOT_COLUMNS}
+                if int(columns["seq"][slot]) == before:
+                    for name, value in values.items():
+                        rows[name][slot] = value
+                    break
+            else:
+                # Left out of this snapshot rather than shown half-written.
+                rows["state"][slot] = FREE
+        rows["slot"] = np.arange(used)
+        in_use = rows["state"] != FREE
+        self.cached = Snapshot(version, horizon, {name: column[in_use] for name, column in rows.items()}, columns)
+        return self.cached
@@ -0,0 +1,36 @@
+import os
+
+STORAGE_MODES = ("sparse", "preallocate")
+
+
+def preallocate(files):
+    # Reserve the full size of every file up front with fallocate so the
+    # filesystem can hand out large contiguous extents instead of growing
+    # files piece by piece. Returns False where fallocate is unsupported.
+    if not hasattr(os, "posix_fallocate"):
+        return False
+    for path, size, pad in files:
+        if pad or size <= 0:
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_blocks * 512 < size:
+                os.posix_fallocate(fd, 0, size)
+        except OSError:
+            return False
+        finally:
+            os.close(fd)
+    return True
+
+
+def existing_files(files):
+    # Whether any of the torrent's files already has data on disk, e.g. from
+    # a run whose resume data was lost.
+    for path, size, pad in files:
+        try:
+            if not pad and os.path.getsize(path) > 0:
+                return True
+        except OSError:
+            pass
+    return False
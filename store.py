@@ -0,0 +1,194 @@
+import json
+import sqlite3
+import threading
+
+TABLES = ("queue", "active", "completed", "limits", "storage")
+
+
+class StateStore:
+    # Write-behind SQLite (WAL) store. put/delete only record the latest value
+    # per key in memory; flush() writes everything pending in one transaction,
+    # so repeated status updates for a torrent cost one row write per flush.
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        for table in TABLES:
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        # Log records are appended one row each and pruned to the ring, so a
+        # flush only writes what was logged since the last one.
+        if "seq" not in {row[1] for row in self.conn.execute("PRAGMA table_info(logs)")}:
+            if self.has_table("logs"):
+                self.conn.execute("ALTER TABLE logs RENAME TO logs_rings")
+            self.conn.execute("CREATE TABLE logs (key TEXT NOT NULL, seq INTEGER NOT NULL, value TEXT NOT NULL, "
+                              "PRIMARY KEY (key, seq))")
+            if self.has_table("logs_rings"):
+                self.conn.execute("INSERT OR IGNORE INTO logs (key, seq, value) "
+                                  "SELECT logs_rings.key, json_extract(record.value, '$[0]'), record.value "
+                                  "FROM logs_rings, json_each(logs_rings.value) AS record")
+                self.conn.execute("DROP TABLE logs_rings")
+        # Read by the API workers: the engine process publishes the completed
+        # catalog (by version) and its views here.
+        self.conn.execute("CREATE TABLE IF NOT EXISTS progress (key TEXT PRIMARY KEY, version INTEGER NOT NULL, "
+                          "value TEXT NOT NULL, name TEXT, completed_at REAL)")
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(progress)")}
+        if "name" not in columns:
+            self.conn.execute("ALTER TABLE progress ADD COLUMN name TEXT")
+            self.conn.execute("UPDATE progress SET name = coalesce(json_extract(value, '$.completed[0].file'), key) "
+                              "WHERE json_extract(value, '$.completed') IS NOT NULL")
+        if "completed_at" not in columns:
+            # Versions are seeded from the clock in ms: the best estimate left.
+            self.conn.execute("ALTER TABLE progress ADD COLUMN completed_at REAL")
+            self.conn.execute("UPDATE progress SET completed_at = version / 1000.0 WHERE name IS NOT NULL")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS progress_version ON progress (version)")
+        # Keyset pagination of the completed catalog by completion or name.
+        self.conn.execute("DROP INDEX IF EXISTS progress_completed")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS progress_completed_at ON progress (completed_at, key) "
+                          "WHERE name IS NOT NULL")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS progress_name ON progress (name, key) WHERE name IS NOT NULL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS published (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.pending = {}
+        # key -> [log records] and key -> oldest seq still kept, since the
+        # last take()
+        self.appends = {}
+        self.log_floor = {}
+        self.lock = threading.Lock()
+
+    def has_table(self, name):
+        return self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                 (name,)).fetchone() is not None
+
+    def put(self, table, key, value):
+        self.pending[(table, key)] = value
+
+    def delete(self, table, key):
+        self.pending[(table, key)] = None
+        if table == "logs":
+            self.appends.pop(key, None)
+            self.log_floor.pop(key, None)
+
+    def append_log(self, key, record, floor):
+        # Records below `floor` (the oldest seq still in the ring) are pruned.
+        self.appends.setdefault(key, []).append(record)
+        self.log_floor[key] = floor
+
+    def take(self):
+        # Called on the event loop thread so values are encoded before any
+        # further in-place mutation.
+        batch, self.pending = self.pending, {}
+        appends, self.appends = self.appends, {}
+        floors, self.log_floor = self.log_floor, {}
+        return ([(table, key, None if value is None else json.dumps(value, default=list))
+                 for (table, key), value in batch.items()],
+                [(key, record[0], json.dumps(record)) for key, records in appends.items() for record in records],
+                list(floors.items()))
+
+    def write(self, batch):
+        rows, logs, floors = batch
+        if not (rows or logs or floors):
+            return
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                for table, key, value in rows:
+                    if value is None:
+                        self.conn.execute(f"DELETE FROM {table} WHERE key = ?", (key,))
+                    else:
+                        self.conn.execute(f"INSERT OR REPLACE INTO {table} (key, value) VALUES (?, ?)", (key, value))
+                self.conn.executemany("INSERT OR REPLACE INTO logs (key, seq, value) VALUES (?, ?, ?)", logs)
+                self.conn.executemany("DELETE FROM logs WHERE key = ? AND seq < ?", floors)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def flush(self):
+        self.write(self.take())
+
+    def load(self, table):
+        with self.lock:
+            rows = self.conn.execute(f"SELECT key, value FROM {table}").fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def load_logs(self, key=None):
+        # key -> records in seq order, for one job or all of them.
+        where, params = ("WHERE key = ?", (key,)) if key is not None else ("", ())
+        with self.lock:
+            rows = self.conn.execute(f"SELECT key, value FROM logs {where} ORDER BY key, seq", params).fetchall()
+        out = {}
+        for key, value in rows:
+            out.setdefault(key, []).append(json.loads(value))
+        return out
+
+    def encode_published(self, rows, docs, deleted=()):
+        # Same as take(): encode on the event loop thread, write from a worker.
+        return ([(key, version, name, completed_at, json.dumps(value, default=list))
+                 for key, version, name, completed_at, value in rows],
+                [(name, json.dumps(value, default=list)) for name, value in docs.items()],
+                [(version, key) for key, version in deleted])
+
+    def publish(self, rows, docs, deleted=()):
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                # A row keeps the completion time it was first published with.
+                self.conn.executemany("INSERT INTO progress (key, version, name, completed_at, value) "
+                                      "VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                                      "version = excluded.version, name = excluded.name, value = excluded.value, "
+                                      "completed_at = coalesce(progress.completed_at, excluded.completed_at)", rows)
+                self.conn.executemany("INSERT OR REPLACE INTO published (key, value) VALUES (?, ?)", docs)
+                # Kept as a marker for deltas, but out of the catalog.
+                self.conn.executemany("UPDATE progress SET version = ?, name = NULL, completed_at = NULL, "
+                                      "value = '{\"completed\": null}' WHERE key = ?", deleted)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def published(self, name):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM published WHERE key = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def published_prefix(self, prefix):
+        # name -> value for every published name starting with `prefix`.
+        with self.lock:
+            rows = self.conn.execute("SELECT key, value FROM published WHERE substr(key, 1, ?) = ?",
+                                     (len(prefix), prefix)).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def prune_published(self, prefix, before):
+        # Drops `prefix` names whose value's "at" is older than `before`.
+        with self.lock:
+            self.conn.execute("DELETE FROM published WHERE substr(key, 1, ?) = ? AND json_extract(value, '$.at') < ?",
+                              (len(prefix), prefix, before))
+
+    def progress_since(self, since=None):
+        with self.lock:
+            rows = self.conn.execute("SELECT key, value FROM progress WHERE version > ? ORDER BY version",
+                                     (-1 if since is None else since,)).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def completed_page(self, column, descending=False, after=None, limit=100):
+        # Completed catalog ordered by (column, key), `column` being
+        # "completed_at" or "name"; `after` is the (value, key) of the
+        # last row of the previous page.
+        direction, compare = ("DESC", "<") if descending else ("ASC", ">")
+        where, params = "name IS NOT NULL", []
+        if after is not None:
+            where += f" AND ({column}, key) {compare} (?, ?)"
+            params.extend(after)
+        with self.lock:
+            rows = self.conn.execute(f"SELECT key, {column}, value FROM progress WHERE {where} "
+                                     f"ORDER BY {column} {direction}, key {direction} LIMIT ?",
+                                     (*params, limit)).fetchall()
+        return [(key, value, json.loads(row)) for key, value, row in rows]
+
+    def completed_count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM progress WHERE name IS NOT NULL").fetchone()[0]
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def jobs(tmp_path_factory):
+    # jobs creates its downloads dir and state.db relative to the working
+    # directory on import; keep them out of the checkout.
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("engine"))
+    try:
+        import jobs
+    finally:
+        os.chdir(cwd)
+    return jobs
+
+
+@pytest.fixture(scope="session")
+def backend(jobs):
+    import backend
+    return backend
@@ -0,0 +1,26 @@
+from assets import negotiate
+
+AVAILABLE = ("br", "gzip")
+
+
+def test_server_preference_wins():
+    assert negotiate("gzip, deflate, br", AVAILABLE) == "br"
+    assert negotiate("gzip", AVAILABLE) == "gzip"
+
+
+def test_q_zero_refuses():
+    assert negotiate("br;q=0, gzip;q=0.5", AVAILABLE) == "gzip"
+    assert negotiate("*;q=0", AVAILABLE) is None
+
+
+def test_wildcard():
+    assert negotiate("*", AVAILABLE) == "br"
+    assert negotiate("br;q=0, *", AVAILABLE) == "gzip"
+
+
+def test_identity():
+    assert negotiate(None, AVAILABLE) is None
+    assert negotiate("", AVAILABLE) is None
+    assert negotiate("identity", AVAILABLE) is None
+    assert negotiate("BR;Q=1", AVAILABLE) == "br"
+    assert negotiate("gzip;q=., br;q=0", AVAILABLE) is None
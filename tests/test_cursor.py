@@ -0,0 +1,26 @@
+import pytest
+
+
+def test_round_trip(backend):
+    cursor = backend.encode_cursor([12.5, "ab" * 20])
+    assert backend.decode_cursor(cursor, (int, float)) == (12.5, "ab" * 20)
+    assert "=" not in cursor
+
+
+@pytest.mark.parametrize("cursor", ["", "!!!", "bm90IGpzb24"])
+def test_garbage(backend, cursor):
+    with pytest.raises(ValueError):
+        backend.decode_cursor(cursor, (int, float))
+
+
+@pytest.mark.parametrize("after", [[True, "ab"], ["name", "ab"], [1, 2], [1, "ab", 3], {"a": 1}])
+def test_wrong_shape_or_type(backend, after):
+    with pytest.raises(ValueError):
+        backend.decode_cursor(backend.encode_cursor(after), (int, float))
+
+
+def test_string_sort_key(backend):
+    cursor = backend.encode_cursor(["name", "ab"])
+    assert backend.decode_cursor(cursor, str) == ("name", "ab")
+    with pytest.raises(ValueError):
+        backend.decode_cursor(backend.encode_cursor([1, "ab"]), str)
@@ -0,0 +1,36 @@
+import base64
+
+HEX = "c12fe1c06bba254a9dc9f519b335aa7c1367a88a"
+
+
+def test_hex_btih(jobs):
+    assert jobs.parse_infohash(f"magnet:?xt=urn:btih:{HEX.upper()}&dn=x") == HEX
+
+
+def test_base32_btih(jobs):
+    digest = base64.b32encode(bytes.fromhex(HEX)).decode()
+    assert jobs.parse_infohash(f"magnet:?xt=urn:btih:{digest}") == HEX
+
+
+def test_trackers_and_name_do_not_change_the_key(jobs):
+    first = jobs.parse_infohash(f"magnet:?xt=urn:btih:{HEX}&tr=udp://a:1&dn=one")
+    second = jobs.parse_infohash(f"magnet:?dn=two&xt=urn:btih:{HEX}")
+    assert first == second == HEX
+
+
+def test_v2_only(jobs):
+    multihash = "1220" + "ab" * 32
+    assert jobs.parse_infohash(f"magnet:?xt=urn:btmh:{multihash.upper()}") == multihash
+
+
+def test_hybrid_prefers_v1(jobs):
+    multihash = "1220" + "ab" * 32
+    assert jobs.parse_infohash(f"magnet:?xt=urn:btmh:{multihash}&xt=urn:btih:{HEX}") == HEX
+
+
+def test_invalid(jobs):
+    assert jobs.parse_infohash("http://example.com") is None
+    assert jobs.parse_infohash("magnet:?dn=nothing") is None
+    assert jobs.parse_infohash("magnet:?xt=urn:btih:" + "z" * 40) is None
+    assert jobs.parse_infohash("magnet:?xt=urn:btih:abc") is None
+    assert jobs.parse_infohash("magnet:?xt=urn:btmh:1220abcd") is None
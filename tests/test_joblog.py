@@ -0,0 +1,57 @@
+from joblog import ERROR, INFO, WARNING, LogStore
+
+
+def messages(records):
+    return [r["message"] for r in records]
+
+
+def test_paging_with_since():
+    logs = LogStore(ring_size=100, max_jobs=10)
+    for i in range(5):
+        logs.add("a", INFO, "line %d", (i,))
+    first = logs.records("a", limit=2)
+    assert messages(first) == ["line 0", "line 1"]
+    rest = logs.records("a", since=first[-1]["seq"], limit=10)
+    assert messages(rest) == ["line 2", "line 3", "line 4"]
+    assert logs.records("a", since=rest[-1]["seq"]) == []
+
+
+def test_tail_and_level():
+    logs = LogStore(ring_size=100, max_jobs=10)
+    logs.add("a", INFO, "one", ())
+    logs.add("a", WARNING, "two", ())
+    logs.add("a", ERROR, "three", ())
+    assert messages(logs.records("a", limit=2, tail=True)) == ["two", "three"]
+    assert messages(logs.records("a", level=WARNING)) == ["two", "three"]
+    assert logs.records("a", level=WARNING)[0]["level"] == "warning"
+
+
+def test_ring_keeps_latest():
+    logs = LogStore(ring_size=3, max_jobs=10)
+    for i in range(5):
+        logs.add("a", INFO, "line %d", (i,))
+    assert messages(logs.records("a")) == ["line 2", "line 3", "line 4"]
+    assert logs.records("missing") == []
+
+
+def test_eviction_spares_kept_jobs():
+    evicted = []
+    running = {"live"}
+    logs = LogStore(ring_size=10, max_jobs=4, on_evict=evicted.append, keep=running.__contains__)
+    logs.add("live", INFO, "start", ())
+    for i in range(20):
+        logs.add(f"done{i}", INFO, "done", ())
+    assert "live" in logs
+    assert "done19" in logs
+    assert "live" not in evicted
+    assert evicted[:2] == ["done0", "done1"]
+    assert sum(1 for job in logs.jobs if job not in running) <= 4 + 4 // 4
+
+
+def test_restore_continues_sequence():
+    logs = LogStore(ring_size=10, max_jobs=10)
+    logs.restore("a", [[41, 0.0, INFO, "old %s", ["x"]], "garbage"])
+    logs.add("a", INFO, "new", ())
+    records = logs.records("a")
+    assert messages(records) == ["old x", "new"]
+    assert records[1]["seq"] == 42
@@ -0,0 +1,56 @@
+import pytest
+
+from jobqueue import JobQueue
+
+
+def test_priority_then_fifo():
+    queue = JobQueue(aging=60)
+    queue.push("a", "magnet:a", 0, enqueued_at=100)
+    queue.push("b", "magnet:b", 1, enqueued_at=100)
+    queue.push("c", "magnet:c", 0, enqueued_at=101)
+    assert [queue.pop()[0] for _ in range(3)] == ["b", "a", "c"]
+    with pytest.raises(KeyError):
+        queue.pop()
+
+
+def test_aging_lets_old_jobs_overtake():
+    queue = JobQueue(aging=60)
+    queue.push("old", "magnet:old", 0, enqueued_at=0)
+    queue.push("urgent", "magnet:urgent", 1, enqueued_at=61)
+    queue.push("urgent2", "magnet:urgent2", 1, enqueued_at=59)
+    assert [queue.pop()[:2] for _ in range(3)] == [
+        ("urgent2", "magnet:urgent2"), ("old", "magnet:old"), ("urgent", "magnet:urgent")]
+
+
+def test_reprioritize_keeps_enqueue_time():
+    queue = JobQueue(aging=60)
+    queue.push("a", "magnet:a", 0, enqueued_at=10)
+    queue.push("b", "magnet:b", 0, enqueued_at=20)
+    queue.reprioritize("b", 1)
+    assert queue.get("b") == {"magnet": "magnet:b", "priority": 1, "enqueued_at": 20}
+    assert [infohash for infohash, _ in queue.head(2)] == ["b", "a"]
+    queue.reprioritize("b", 0)
+    assert queue.pop()[0] == "a"
+    assert len(queue) == 1
+
+
+def test_push_existing_replaces_and_remove():
+    queue = JobQueue(aging=60)
+    queue.push("a", "magnet:a", 0, enqueued_at=10)
+    queue.push("a", "magnet:a2", 2, enqueued_at=30)
+    assert len(queue) == 1
+    assert queue.get("a")["magnet"] == "magnet:a2"
+    queue.remove("a")
+    assert "a" not in queue
+    with pytest.raises(KeyError):
+        queue.pop()
+
+
+def test_dead_entries_are_compacted():
+    queue = JobQueue(aging=60)
+    for i in range(200):
+        queue.push(str(i), "m", 0, enqueued_at=i)
+    for i in range(190):
+        queue.remove(str(i))
+    assert len(queue.heap) <= 2 * len(queue) + 64
+    assert [queue.pop()[0] for _ in range(10)] == [str(i) for i in range(190, 200)]
@@ -0,0 +1,41 @@
+import pytest
+
+
+@pytest.fixture(scope="module")
+def app(jobs):
+    pytest.importorskip("fastapi")
+    import app
+    return app
+
+
+@pytest.fixture
+def parse_range(app):
+    return app.parse_range
+
+
+def test_single_ranges(parse_range):
+    assert parse_range("bytes=0-99", 1000) == [(0, 99)]
+    assert parse_range("bytes=900-", 1000) == [(900, 999)]
+    assert parse_range("bytes=-100", 1000) == [(900, 999)]
+    assert parse_range("bytes=-5000", 1000) == [(0, 999)]
+    assert parse_range("bytes=990-2000", 1000) == [(990, 999)]
+
+
+def test_multiple_ranges_are_sorted_and_coalesced(parse_range):
+    assert parse_range("bytes=500-599, 0-99", 1000) == [(0, 99), (500, 599)]
+    assert parse_range("bytes=0-99,100-199,150-300", 1000) == [(0, 300)]
+
+
+def test_unsatisfiable(parse_range):
+    assert parse_range("bytes=1000-1100", 1000) == []
+    assert parse_range("bytes=-0", 1000) == []
+    assert parse_range("bytes=0-10", 0) == []
+
+
+def test_ignored(app, parse_range):
+    assert parse_range("items=0-10", 1000) is None
+    assert parse_range("bytes=abc-10", 1000) is None
+    assert parse_range("bytes=10-5", 1000) is None
+    assert parse_range("bytes=10", 1000) is None
+    spec = ",".join(f"{i * 10}-{i * 10}" for i in range(app.MAX_RANGES + 1))
+    assert parse_range("bytes=" + spec, 100000) is None
@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+
+import pytest
+
+from statustable import STATUS_CODES, StatusReader, StatusWriter
+
+
+def status(name, progress, rate=0, peers=0):
+    return SimpleNamespace(status=name, progress=progress, download_rate=rate, peers=peers, total_size=1000,
+                           download_limit=0, upload_limit=0, magnet=f"magnet:?dn={progress}")
+
+
+@pytest.fixture
+def table(tmp_path):
+    path = str(tmp_path / "status")
+    writer = StatusWriter(path, 8, 1)
+    yield writer, StatusReader(path)
+    writer.close()
+
+
+def infohash(i):
+    return f"{i:040x}"
+
+
+def test_paging_visits_every_row_once(table):
+    writer, reader = table
+    for i in range(5):
+        writer.put(infohash(i), status("Downloading", 10.0 * (i % 3)), 2)
+    writer.publish(2)
+    snapshot = reader.snapshot()
+    seen, after = [], None
+    while True:
+        records, after, total = snapshot.select(key="progress", after=after, limit=2)
+        assert total == 5
+        seen.extend(records)
+        if after is None:
+            break
+    assert seen == [infohash(0), infohash(3), infohash(1), infohash(4), infohash(2)]
+    assert records[infohash(2)]["magnet"] == "magnet:?dn=20.0"
+
+
+def test_descending_and_status_filter(table):
+    writer, reader = table
+    writer.put(infohash(0), status("Downloading", 50.0), 2)
+    writer.put(infohash(1), status("Paused", 70.0), 2)
+    writer.put(infohash(2), status("Downloading", 90.0), 2)
+    writer.publish(2)
+    records, after, total = reader.snapshot().select([STATUS_CODES["Downloading"]], "progress", True, limit=1)
+    assert list(records) == [infohash(2)]
+    assert total == 2
+    records, after, _ = reader.snapshot().select([STATUS_CODES["Downloading"]], "progress", True, after, 1)
+    assert list(records) == [infohash(0)]
+    assert after is None
+
+
+def test_tombstones_and_horizon(table):
+    writer, reader = table
+    writer.put(infohash(0), status("Downloading", 1.0), 2)
+    writer.put(infohash(1), status("Downloading", 1.0), 2)
+    writer.publish(2)
+    writer.remove(infohash(0), 3)
+    writer.publish(3)
+    snapshot = reader.snapshot()
+    assert len(snapshot) == 1
+    assert snapshot.removed_since(2) == [infohash(0)]
+    assert snapshot.removed_since(3) == []
+    assert list(snapshot.records(since=2)) == []
+    assert reader.header() == (3, 1)
+
+    # Filling the table reuses the oldest tombstone and moves the horizon.
+    for i in range(2, 9):
+        writer.put(infohash(i), status("Downloading", 1.0), 4)
+    writer.publish(4)
+    assert reader.header() == (4, 3)
+    assert reader.snapshot().removed_since(0) == []
+    with pytest.raises(RuntimeError):
+        writer.put(infohash(9), status("Downloading", 1.0), 5)
+
+
+def test_readding_reuses_its_tombstone(table):
+    writer, reader = table
+    writer.put(infohash(0), status("Downloading", 1.0), 2)
+    writer.remove(infohash(0), 3)
+    writer.put(infohash(0), status("Paused", 5.0), 4)
+    writer.publish(4)
+    snapshot = reader.snapshot()
+    assert snapshot.removed_since(0) == []
+    assert snapshot.records()[infohash(0)]["status"] == "Paused"
+    assert reader.header() == (4, 1)
+
+
+def test_reader_before_engine_starts(tmp_path):
+    reader = StatusReader(str(tmp_path / "missing"))
+    assert reader.header() is None
+    assert reader.snapshot() is None
@@ -0,0 +1,98 @@
+import asyncio
+import bisect
+import hashlib
+import mmap
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+BATCH_BYTES = 64 * 1024 * 1024
+# Workers are not forked from the engine process, whose libtorrent threads
+# may hold locks at fork time.
+POOL_CONTEXT = multiprocessing.get_context("forkserver")
+
+# Per worker process: path -> mmap (or None when missing/short)
+_maps = {}
+
+
+def _mapping(path, size):
+    if path not in _maps:
+        try:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size < size:
+                    raise OSError("short file")
+                _maps[path] = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            _maps[path] = None
+    return _maps[path]
+
+
+def hash_batch(files, piece_length, first, hashes):
+    # files: [(path, size, is_pad)] in torrent order. Returns (first, [ok]).
+    offsets = []
+    total = 0
+    for _, size, _ in files:
+        offsets.append(total)
+        total += size
+    results = []
+    for i, expected in enumerate(hashes):
+        start = (first + i) * piece_length
+        end = min(start + piece_length, total)
+        digest = hashlib.sha1()
+        pos = start
+        ok = True
+        while pos < end:
+            index = bisect.bisect_right(offsets, pos) - 1
+            path, size, pad = files[index]
+            stop = min(end, offsets[index] + size)
+            if pad:
+                digest.update(bytes(stop - pos))
+            else:
+                data = _mapping(path, size)
+                if data is None:
+                    ok = False
+                    break
+                digest.update(memoryview(data)[pos - offsets[index]:stop - offsets[index]])
+            pos = stop
+        results.append(ok and digest.digest() == expected)
+    return first, results
+
+
+def batches(piece_length, hashes):
+    step = max(1, BATCH_BYTES // piece_length)
+    for first in range(0, len(hashes), step):
+        yield first, hashes[first:first + step]
+
+
+def verify_pieces(files, piece_length, hashes, workers=None):
+    have = [False] * len(hashes)
+    with ProcessPoolExecutor(workers, mp_context=POOL_CONTEXT) as pool:
+        jobs = [pool.submit(hash_batch, files, piece_length, first, chunk)
+                for first, chunk in batches(piece_length, hashes)]
+        for job in jobs:
+            first, results = job.result()
+            have[first:first + len(results)] = results
+    return have
+
+
+async def verify_pieces_async(files, piece_length, hashes, workers=None, on_progress=None):
+    # Hashes piece batches across a process pool, reading through mmaps.
+    # on_progress(done, total) is called on the event loop as batches finish.
+    loop = asyncio.get_running_loop()
+    have = [False] * len(hashes)
+    done = 0
+    pool = ProcessPoolExecutor(workers, mp_context=POOL_CONTEXT)
+    try:
+        jobs = [loop.run_in_executor(pool, hash_batch, files, piece_length, first, chunk)
+                for first, chunk in batches(piece_length, hashes)]
+        for job in asyncio.as_completed(jobs):
+            first, results = await job
+            have[first:first + len(results)] = results
+            done += len(results)
+            if on_progress:
+                on_progress(done, len(hashes))
+    finally:
+        # On cancellation, queued batches are dropped instead of being run to
+        # completion on the event loop.
+        pool.shutdown(wait=False, cancel_futures=True)
+    return have